@@ -6,6 +6,8 @@ Automates the generation of EDI mapping files by analyzing sample EDI files
 and generating mappings for ERP field definitions using AI.
 """
 import argparse
+import asyncio
+import multiprocessing
 import sys
 import time
 import yaml
@@ -18,7 +20,6 @@ from src.excel_reader import read_erp_structure
 from src.excel_writer import write_mapping_output, create_summary_sheet
 from src.ai_client import AIClient
 from src.record_processor import RecordProcessor
-from src.parallel_executor import ParallelExecutor
 from src.pdf_constraint_extractor import PdfConstraintExtractor
 
 
@@ -186,15 +187,12 @@ Example usage:
         # Initialize record processor (Phase 3)
         processor = RecordProcessor(ai_client, edi_parsed, constraints)
         
-        # Initialize parallel executor
-        executor = ParallelExecutor(max_threads=config.get("max_threads", 5))
-        
-        # Process all records in parallel
+        # Process all records concurrently (async LLM calls, bounded by max_threads)
         logger.info("Processing records (Phase 3)...")
-        all_mappings = executor.process_records_parallel(
-            records=structure,
-            processor_func=processor.process_record
-        )
+        all_mappings = asyncio.run(processor.aprocess_all(
+            structure,
+            max_concurrency=config.get("max_threads", 5)
+        ))
         
         # Write output (Phase 4)
         logger.info("Writing output file (Phase 4)...")
@@ -243,4 +241,6 @@ Example usage:
 
 
 if __name__ == "__main__":
+    # Needed for the spawned PDF extraction workers in the PyInstaller build
+    multiprocessing.freeze_support()
     sys.exit(main())
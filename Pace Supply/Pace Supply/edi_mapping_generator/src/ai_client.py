@@ -2,14 +2,28 @@
 AI client module for LLM integration via company portal.
 Supports different authentication methods and includes JSON repair logic.
 """
+import asyncio
 import json
+import random
 import re
+import threading
 import time
 import httpx
 from typing import Dict, List, Any, Optional
 from logger import get_logger
 
 
+# Throttling and transient gateway failures are worth retrying; other
+# non-200 codes (auth, bad request) will fail the same way every time.
+_RETRY_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+_BACKOFF_BASE = 1.0
+_BACKOFF_MAX = 30.0
+
+# One pool per client, shared by every record/chunk worker hitting the portal.
+_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_UNCLOSED_CLIENT_WARNING = "Async HTTP client was not closed before its event loop stopped; call aclose()"
+
+
 class AIClient:
     """AI client using OpenAI-compatible API with custom base URL and auth."""
     
@@ -58,7 +72,10 @@ class AIClient:
             "Content-Type": "application/json",
             **self._get_auth_headers()
         }
-        self.client = httpx.Client(timeout=self.timeout)
+        self.client = httpx.Client(timeout=self.timeout, limits=_POOL_LIMITS)
+        # One AsyncClient per event loop, created lazily inside it (see aget_completion)
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._async_lock = threading.Lock()
         self.logger.info(f"Initialized LLM client: {self.base_url}, model: {self.model}, auth: {self.auth_type}")
     
     def generate_mapping(self, edi_summary: str, record_num: str, 
@@ -145,7 +162,103 @@ IMPORTANT:
     
     def get_completion(self, prompt: str, system_prompt: str = "You are an EDI mapping expert. Always respond with valid JSON only. Keep responses concise.") -> str:
         """Generic method to get completion from LLM."""
-        payload = {
+        payload = self._completion_payload(prompt, system_prompt)
+        url = f"{self.base_url}/chat/completions"
+        
+        attempts = max(1, self.max_retries)
+        for attempt in range(attempts):
+            try:
+                response = self.client.post(url, json=payload, headers=self.headers)
+            except httpx.TransportError as e:
+                if attempt == attempts - 1:
+                    raise
+                delay = self._backoff_delay(attempt)
+                self.logger.warning(f"LLM request failed ({e}), retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            
+            if response.status_code in _RETRY_STATUS and attempt < attempts - 1:
+                delay = self._backoff_delay(attempt, response)
+                self.logger.warning(f"LLM returned {response.status_code}, retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            
+            if response.status_code != 200:
+                raise Exception(f"Error code: {response.status_code} - {response.text}")
+            
+            return self._completion_text(response.json())
+
+    async def aget_completion(self, prompt: str, system_prompt: str = "You are an EDI mapping expert. Always respond with valid JSON only. Keep responses concise.") -> str:
+        """Async variant of get_completion, for firing many prompts concurrently."""
+        payload = self._completion_payload(prompt, system_prompt)
+        url = f"{self.base_url}/chat/completions"
+        
+        attempts = max(1, self.max_retries)
+        for attempt in range(attempts):
+            try:
+                response = await self._get_async_client().post(url, json=payload, headers=self.headers)
+            except httpx.TransportError as e:
+                if attempt == attempts - 1:
+                    raise
+                delay = self._backoff_delay(attempt)
+                self.logger.warning(f"LLM request failed ({e}), retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            
+            if response.status_code in _RETRY_STATUS and attempt < attempts - 1:
+                delay = self._backoff_delay(attempt, response)
+                self.logger.warning(f"LLM returned {response.status_code}, retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            
+            if response.status_code != 200:
+                raise Exception(f"Error code: {response.status_code} - {response.text}")
+            
+            return self._completion_text(response.json())
+
+    def call_budget(self) -> float:
+        """Generous upper bound, in seconds, on one completion call including retries and backoff."""
+        # httpx's timeout applies per connect/read rather than per request, hence the extra attempt
+        return self.timeout * (self.max_retries + 1) + _BACKOFF_MAX * self.max_retries
+
+    @staticmethod
+    def _backoff_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Exponential backoff with full jitter; honours a numeric Retry-After if the portal sends one."""
+        if response is not None:
+            retry_after = response.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), _BACKOFF_MAX)
+        return random.uniform(0, min(_BACKOFF_MAX, _BACKOFF_BASE * (2 ** attempt)))
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Return the AsyncClient bound to the current event loop (each asyncio.run gets its own)."""
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                self._drop_closed_loop_clients()
+                client = self._async_clients[loop] = httpx.AsyncClient(timeout=self.timeout, limits=_POOL_LIMITS)
+            return client
+
+    def _drop_closed_loop_clients(self):
+        """Forget clients whose event loop has already shut down (caller holds _async_lock)."""
+        for loop in [loop for loop in self._async_clients if loop.is_closed()]:
+            # Its connections belong to the dead loop and cannot be closed from another one
+            self.logger.warning(_UNCLOSED_CLIENT_WARNING)
+            del self._async_clients[loop]
+
+    async def aclose(self):
+        """Close this event loop's async HTTP client; call before the loop shuts down."""
+        with self._async_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+            # Other running loops own their clients and close them in their own aclose()
+            self._drop_closed_loop_clients()
+        if client is not None:
+            await client.aclose()
+
+    def _completion_payload(self, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        """Build the chat/completions request body."""
+        return {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system_prompt},
@@ -154,16 +267,10 @@ IMPORTANT:
             "temperature": 0.1,
             "max_tokens": 4096
         }
-        
-        url = f"{self.base_url}/chat/completions"
-        
-        response = self.client.post(url, json=payload, headers=self.headers)
-        
-        if response.status_code != 200:
-            raise Exception(f"Error code: {response.status_code} - {response.text}")
-        
-        data = response.json()
-        
+
+    @staticmethod
+    def _completion_text(data: Dict[str, Any]) -> str:
+        """Pull the completion text out of a chat/completions response."""
         # Handle different response formats
         if "choices" in data:
             return data["choices"][0]["message"]["content"]
@@ -198,37 +305,47 @@ IMPORTANT:
         # Using a context manager in the caller is tricky with generators, 
         # so we rely on the caller to handle the stream or we yield from it.
         try:
-            with self.client.stream("POST", url, json=payload, headers=self.headers) as response:
-                if response.status_code != 200:
-                     self.logger.error(f"Stream Error: {response.text}")
-                     yield f"Error: {response.status_code}"
-                     return
+            attempts = max(1, self.max_retries)
+            for attempt in range(attempts):
+                with self.client.stream("POST", url, json=payload, headers=self.headers) as response:
+                    # Nothing has been yielded yet, so a throttled stream can be reopened safely
+                    if response.status_code in _RETRY_STATUS and attempt < attempts - 1:
+                        delay = self._backoff_delay(attempt, response)
+                        self.logger.warning(f"Stream returned {response.status_code}, retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+                        time.sleep(delay)
+                        continue
+
+                    if response.status_code != 200:
+                         self.logger.error(f"Stream Error: {response.text}")
+                         yield f"Error: {response.status_code}"
+                         return
 
-                for line in response.iter_lines():
-                    if line:
-                        # OpenAI format: data: {...}
-                        if line.startswith("data: "):
-                            data_str = line[6:]
-                            if data_str.strip() == "[DONE]":
-                                break
-                            try:
-                                data = json.loads(data_str)
-                                delta = data.get("choices", [{}])[0].get("delta", {})
-                                content = delta.get("content")
-                                if content:
-                                    yield content
-                            except:
-                                pass
-                        # Fallback for non-SSE raw streaming (if custom model behaves differently)
-                        else:
-                            try:
-                                # Try parsing as direct JSON chunk if not SSE
-                                data = json.loads(line)
-                                if "response" in data: 
-                                    yield data["response"]
-                            except:
-                                # Raw text fallback
-                                yield line
+                    for line in response.iter_lines():
+                        if line:
+                            # OpenAI format: data: {...}
+                            if line.startswith("data: "):
+                                data_str = line[6:]
+                                if data_str.strip() == "[DONE]":
+                                    break
+                                try:
+                                    data = json.loads(data_str)
+                                    delta = data.get("choices", [{}])[0].get("delta", {})
+                                    content = delta.get("content")
+                                    if content:
+                                        yield content
+                                except:
+                                    pass
+                            # Fallback for non-SSE raw streaming (if custom model behaves differently)
+                            else:
+                                try:
+                                    # Try parsing as direct JSON chunk if not SSE
+                                    data = json.loads(line)
+                                    if "response" in data: 
+                                        yield data["response"]
+                                except:
+                                    # Raw text fallback
+                                    yield line
+                return
 
         except Exception as e:
             self.logger.error(f"Streaming failed: {e}")
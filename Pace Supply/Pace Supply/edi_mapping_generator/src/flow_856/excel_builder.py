@@ -1,6 +1,8 @@
 from pathlib import Path
-from openpyxl import load_workbook
-from typing import Dict, Any, List
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from typing import Dict, Any, List, Optional, Tuple
 import shutil
 import time
 
@@ -9,6 +11,10 @@ class ExcelBuilder856:
     Builds the 856 Output Excel file.
     Follows format of 'PaceSupply_856_Outbound.xlsx'.
     """
+
+    SHEET_NAME = "ANSI X12 Mapping"
+    # Template columns A-H (used as the header row when streaming)
+    HEADERS = ["Seg.", "Occ./Max", "Element", "Type", "Source (Mapping)", "Hardcode", "Meaning", "Req"]
     
     def __init__(self, template_path: str = "856/PaceSupply_856_Outbound.xlsx"):
         # Resolve path relative to project root (parent of src)
@@ -21,7 +27,8 @@ class ExcelBuilder856:
             # Fallback path logic if needed
             pass
             
-    def build_excel(self, mappings: Dict[str, Any], output_path: str) -> str:
+    def build_excel(self, mappings: Dict[str, Any], output_path: str,
+                    write_only: Optional[bool] = None) -> str:
         """
         Populate the template with mappings.
         mappings structure: 
@@ -30,16 +37,25 @@ class ExcelBuilder856:
              { "segment": "BSN", "element": "BSN01", "erp_record": "0010", "erp_field": "DOC...", "logic": "..." } 
           ]
         }
+
+        write_only: stream rows into a fresh write-only workbook instead of
+        editing a copy of the template. Defaults to streaming only when the
+        template is missing, since write-only workbooks cannot load one.
         """
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         final_path = Path(output_path) / f"856_Mapping_{timestamp}.xlsx"
+
+        if write_only is None:
+            write_only = not self.template_path.exists()
+        if write_only:
+            return self._build_excel_streaming(mappings, final_path)
         
         # Copy template
         shutil.copy(self.template_path, final_path)
         
         wb = load_workbook(final_path)
-        if "ANSI X12 Mapping" in wb.sheetnames:
-            ws = wb["ANSI X12 Mapping"]
+        if self.SHEET_NAME in wb.sheetnames:
+            ws = wb[self.SHEET_NAME]
         else:
             ws = wb.active
             
@@ -80,61 +96,94 @@ class ExcelBuilder856:
         
         for i, item in enumerate(mapped_data):
             row_idx = start_row + i
-            
-            # 1. Segment (Col A) - Grouping logic
-            segment = item.get("segment", "")
-            if segment == last_segment:
-                self._safe_write(ws, row_idx, 1, None)
-            else:
-                self._safe_write(ws, row_idx, 1, segment)
-                last_segment = segment
-                
-            # 3. Element (Col C)
-            element = item.get("element", "")
-            self._safe_write(ws, row_idx, 3, element)
-            
-            # 6. Description (Col G) - Default
-            desc = item.get("logic", "")
-            self._safe_write(ws, row_idx, 7, desc)
-            
-            # 7. Requirement (Col H) - Default Mandatory
-            self._safe_write(ws, row_idx, 8, "Mandatory")
-            
-            # MAPPING LOGIC
-            typ = item.get("type", "")
-            hardcode = item.get("hardcode", "")
-            
-            rec = item.get("erp_record", "")
-            field = item.get("erp_field", "")
-            pos = item.get("erp_position", "")
+            cells, last_segment = self._build_row_cells(item, last_segment)
+            for col, value in cells.items():
+                self._safe_write(ws, row_idx, col, value)
 
-            if typ:
-                self._safe_write(ws, row_idx, 4, typ)
-                
-                if typ == "Source":
-                     if rec and pos:
-                         self._safe_write(ws, row_idx, 5, f"{rec}/{pos}")
-                     self._safe_write(ws, row_idx, 7, field)
-                     
-                elif typ in ["Constant", "Translation"]:
-                     self._safe_write(ws, row_idx, 6, hardcode)
-                     self._safe_write(ws, row_idx, 7, desc)
-                     
-                     if typ == "Translation" and rec and pos:
-                         self._safe_write(ws, row_idx, 5, f"{rec}/{pos}")
-                else:
-                     self._safe_write(ws, row_idx, 7, desc)
-            else:
-                self._safe_write(ws, row_idx, 7, desc)
-                if rec and field:
-                    self._safe_write(ws, row_idx, 4, "Source")
-                    self._safe_write(ws, row_idx, 7, field)
-                    if pos:
-                         self._safe_write(ws, row_idx, 5, f"{rec}/{pos}")
+        wb.save(final_path)
+        return str(final_path)
+
+    def _build_excel_streaming(self, mappings: Dict[str, Any], final_path: Path) -> str:
+        """Write header + mapping rows with constant memory (no template)."""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(self.SHEET_NAME)
+
+        header_font = Font(bold=True)
+        header = []
+        for title in self.HEADERS:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = header_font
+            header.append(cell)
+        ws.append(header)
+
+        width = len(self.HEADERS)
+        last_segment = None
+        for item in mappings.get("mappings", []):
+            cells, last_segment = self._build_row_cells(item, last_segment)
+            ws.append([cells.get(col) for col in range(1, width + 1)])
 
         wb.save(final_path)
         return str(final_path)
 
+    def _build_row_cells(self, item: Dict[str, Any], last_segment: Optional[str]) -> Tuple[Dict[int, Any], Optional[str]]:
+        """
+        Resolve the template cells (1-based column -> value) for one mapping.
+        Returns the cells and the updated last_segment for grouping.
+        """
+        cells: Dict[int, Any] = {}
+
+        # 1. Segment (Col A) - Grouping logic
+        segment = item.get("segment", "")
+        if segment == last_segment:
+            cells[1] = None
+        else:
+            cells[1] = segment
+            last_segment = segment
+            
+        # 3. Element (Col C)
+        cells[3] = item.get("element", "")
+        
+        # 6. Description (Col G) - Default
+        desc = item.get("logic", "")
+        cells[7] = desc
+        
+        # 7. Requirement (Col H) - Default Mandatory
+        cells[8] = "Mandatory"
+        
+        # MAPPING LOGIC
+        typ = item.get("type", "")
+        hardcode = item.get("hardcode", "")
+        
+        rec = item.get("erp_record", "")
+        field = item.get("erp_field", "")
+        pos = item.get("erp_position", "")
+
+        if typ:
+            cells[4] = typ
+            
+            if typ == "Source":
+                 if rec and pos:
+                     cells[5] = f"{rec}/{pos}"
+                 cells[7] = field
+                 
+            elif typ in ["Constant", "Translation"]:
+                 cells[6] = hardcode
+                 cells[7] = desc
+                 
+                 if typ == "Translation" and rec and pos:
+                     cells[5] = f"{rec}/{pos}"
+            else:
+                 cells[7] = desc
+        else:
+            cells[7] = desc
+            if rec and field:
+                cells[4] = "Source"
+                cells[7] = field
+                if pos:
+                     cells[5] = f"{rec}/{pos}"
+
+        return cells, last_segment
+
     def _safe_write(self, ws, row, col, value):
         from openpyxl.cell.cell import MergedCell
         cell = ws.cell(row=row, column=col)
@@ -9,9 +9,14 @@ For each field:
 """
 from typing import List, Dict, Any, Tuple, Optional
 import json
+import logging
+from types import MappingProxyType
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from logger import get_logger
 
+# Shared read-only default for PDF lookups that miss (avoids a new {} per row)
+_NO_PDF_INFO = MappingProxyType({})
+
 
 class GapAnalyzer:
     """
@@ -53,6 +58,8 @@ class GapAnalyzer:
         self.pdf_lookup: Dict[Tuple[str, str], Dict] = {}
         # Also keep segment-level info: segment_code → segment dict
         self.pdf_seg_lookup: Dict[str, Dict] = {}
+        # Compact JSON catalogue of PDF elements for AI prompts (built once)
+        self._pdf_catalogue_str: str = "[]"
 
         self._build_pdf_index(pdf_segments)
 
@@ -86,6 +93,14 @@ class GapAnalyzer:
                     "values": field.get("values", []),
                 }
 
+        self._pdf_catalogue_str = json.dumps(
+            [
+                {"seg": seg, "elem": elem, "desc": info.get("description", "")}
+                for (seg, elem), info in self.pdf_lookup.items()
+            ],
+            indent=None,
+        )
+
         self.logger.info(
             f"PDF Index: {len(self.pdf_seg_lookup)} segments, "
             f"{len(self.pdf_lookup)} elements"
@@ -102,7 +117,9 @@ class GapAnalyzer:
           - grid: list of rows (each row is a list of strings). Row 0 = headers.
           - flags: { row_idx: { "col": int, "reason": str } }  for flagged cells
         """
-        grid: List[List[str]] = [list(self.GRID_HEADERS)]
+        # One row per ERP field plus the header — size is known up front
+        grid: List[List[str]] = [None] * (len(erp_fields) + 1)
+        grid[0] = list(self.GRID_HEADERS)
         flags: Dict[int, Dict[str, Any]] = {}  # row_idx → {"col": 9, "reason": "..."}
 
         # Collect unmapped fields for batch AI matching
@@ -111,7 +128,7 @@ class GapAnalyzer:
         # Track STANDARD+PDF rows with PDF values for value flagging
         flaggable_rows: List[Dict] = []  # {"row_idx", "mapping_rule", "pdf_values", "x12_elem"}
 
-        for erp in erp_fields:
+        for row_idx, erp in enumerate(erp_fields, 1):
             sap_seg = erp["sap_segment"]
             sap_field = erp["sap_field"]
 
@@ -129,7 +146,7 @@ class GapAnalyzer:
 
                 # --- Step 2: PDF cross-reference ---
                 pdf_elem = self.pdf_lookup.get((x12_seg, x12_elem))
-                pdf_seg_info = self.pdf_seg_lookup.get(x12_seg, {})
+                pdf_seg_info = self.pdf_seg_lookup.get(x12_seg, _NO_PDF_INFO)
 
                 if pdf_elem:
                     # STANDARD + PDF confirmed
@@ -168,12 +185,12 @@ class GapAnalyzer:
                     confidence,
                     notes,
                 ]
-                grid.append(row)
+                grid[row_idx] = row
 
                 # Track for value flagging (only STANDARD+PDF with values)
                 if source == "STANDARD+PDF" and pdf_values:
                     flaggable_rows.append({
-                        "row_idx": len(grid) - 1,
+                        "row_idx": row_idx,
                         "mapping_rule": mapping_rule,
                         "pdf_values": pdf_values,
                         "x12_elem": x12_elem,
@@ -199,47 +216,61 @@ class GapAnalyzer:
                     "",
                     "",
                 ]
-                grid.append(row)
+                grid[row_idx] = row
                 unmapped_fields.append(erp)
-                unmapped_indices.append(len(grid) - 1)
-
-        # --- Step 3: AI Semantic Matching for unmapped fields ---
-        if unmapped_fields and self.ai_client and self.pdf_lookup:
-            self.logger.info(f"Running AI semantic matching for {len(unmapped_fields)} unmapped fields...")
-            ai_matches = self._batch_ai_match(unmapped_fields)
-
-            for idx, match in zip(unmapped_indices, ai_matches):
-                if match and match.get("x12_element"):
-                    grid[idx][6] = match.get("x12_segment", "")
-                    grid[idx][7] = match.get("x12_element", "")
-                    grid[idx][8] = match.get("x12_description", "")
-                    grid[idx][9] = match.get("mapping_rule", "Semantic match")
-                    # PDF info for the matched element
-                    pdf_key = (match.get("x12_segment", ""), match.get("x12_element", ""))
-                    pdf_elem = self.pdf_lookup.get(pdf_key, {})
-                    pdf_seg_info = self.pdf_seg_lookup.get(match.get("x12_segment", ""), {})
-                    grid[idx][10] = pdf_seg_info.get("status", "")
-                    grid[idx][11] = pdf_elem.get("status", "")
-                    grid[idx][12] = self._format_values(pdf_elem.get("values", []))
-                    grid[idx][13] = "AI_MATCH"
-                    grid[idx][14] = match.get("confidence", "LOW")
-                    grid[idx][15] = match.get("reason", "")
-
-        # --- Step 4: AI Value Flagging for STANDARD+PDF rows ---
-        if flaggable_rows and self.ai_client:
-            self.logger.info(f"Running AI value flagging for {len(flaggable_rows)} standard+PDF rows...")
-            flag_results = self._flag_value_discrepancies(flaggable_rows)
-            for row_idx, reason in flag_results.items():
-                flags[row_idx] = {"col": 9, "reason": reason}
-            self.logger.info(f"Flagged {len(flags)} rows with value discrepancies")
-
-        # Summary
-        total = len(grid) - 1
-        sources = {}
-        for row in grid[1:]:
-            s = row[13]
-            sources[s] = sources.get(s, 0) + 1
-        self.logger.info(f"Grid built: {total} rows. Sources: {sources}")
+                unmapped_indices.append(row_idx)
+
+        # --- Steps 3 & 4 are independent AI round-trips: run them concurrently ---
+        run_matching = bool(unmapped_fields and self.ai_client and self.pdf_lookup)
+        run_flagging = bool(flaggable_rows and self.ai_client)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            match_future = None
+            flag_future = None
+
+            # --- Step 3: AI Semantic Matching for unmapped fields ---
+            if run_matching:
+                self.logger.info(f"Running AI semantic matching for {len(unmapped_fields)} unmapped fields...")
+                match_future = executor.submit(self._batch_ai_match, unmapped_fields)
+
+            # --- Step 4: AI Value Flagging for STANDARD+PDF rows ---
+            if run_flagging:
+                self.logger.info(f"Running AI value flagging for {len(flaggable_rows)} standard+PDF rows...")
+                flag_future = executor.submit(self._flag_value_discrepancies, flaggable_rows)
+
+            if match_future is not None:
+                ai_matches = match_future.result()
+
+                for idx, match in zip(unmapped_indices, ai_matches):
+                    if match and match.get("x12_element"):
+                        grid[idx][6] = match.get("x12_segment", "")
+                        grid[idx][7] = match.get("x12_element", "")
+                        grid[idx][8] = match.get("x12_description", "")
+                        grid[idx][9] = match.get("mapping_rule", "Semantic match")
+                        # PDF info for the matched element
+                        pdf_key = (match.get("x12_segment", ""), match.get("x12_element", ""))
+                        pdf_elem = self.pdf_lookup.get(pdf_key, _NO_PDF_INFO)
+                        pdf_seg_info = self.pdf_seg_lookup.get(match.get("x12_segment", ""), _NO_PDF_INFO)
+                        grid[idx][10] = pdf_seg_info.get("status", "")
+                        grid[idx][11] = pdf_elem.get("status", "")
+                        grid[idx][12] = self._format_values(pdf_elem.get("values", []))
+                        grid[idx][13] = "AI_MATCH"
+                        grid[idx][14] = match.get("confidence", "LOW")
+                        grid[idx][15] = match.get("reason", "")
+
+            if flag_future is not None:
+                flag_results = flag_future.result()
+                for row_idx, reason in flag_results.items():
+                    flags[row_idx] = {"col": 9, "reason": reason}
+                self.logger.info(f"Flagged {len(flags)} rows with value discrepancies")
+
+        # Summary — only tally sources when INFO is actually emitted
+        if self.logger.isEnabledFor(logging.INFO):
+            sources = {}
+            for row in grid[1:]:
+                s = row[13]
+                sources[s] = sources.get(s, 0) + 1
+            self.logger.info("Grid built: %d rows. Sources: %s", len(grid) - 1, sources)
 
         return grid, flags
 
@@ -254,16 +285,7 @@ class GapAnalyzer:
         """
         BATCH_SIZE = 30
 
-        # Prepare compact PDF catalogue
-        pdf_catalogue = []
-        for (seg, elem), info in self.pdf_lookup.items():
-            pdf_catalogue.append({
-                "seg": seg,
-                "elem": elem,
-                "desc": info.get("description", ""),
-            })
-
-        pdf_catalogue_str = json.dumps(pdf_catalogue, indent=None)
+        pdf_catalogue_str = self._pdf_catalogue_str
 
         # Split into batches
         batches = []
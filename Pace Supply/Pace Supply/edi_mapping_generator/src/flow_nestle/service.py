@@ -10,8 +10,11 @@ Flow:
 from typing import Dict, Any, List
 import uuid
 import os
+import tempfile
 from pathlib import Path
 
+from openpyxl import Workbook
+
 from .erp_loader import ErpLoader
 from .standard_loader import StandardLoader
 from .gap_analyzer import GapAnalyzer
@@ -49,6 +52,7 @@ class NestleService:
 
     def create_session(self, pdf_path: str) -> str:
         """Create a new session for a Nestle 850 mapping task."""
+        # Random, not sequential: IDs are served in API URLs and must not be guessable
         session_id = str(uuid.uuid4())
         self.sessions[session_id] = {
             "type": "nestle_850",
@@ -98,9 +102,6 @@ class NestleService:
 
     def generate_excel(self, session_id: str) -> str:
         """Generate an Excel file from the current grid state."""
-        import pandas as pd
-        import tempfile
-
         session = self.sessions.get(session_id)
         if not session or "grid" not in session:
             raise ValueError("Invalid Session or no grid generated")
@@ -109,12 +110,14 @@ class NestleService:
         if not grid:
             raise ValueError("Grid is empty")
 
-        # Grid[0] is headers
-        df = pd.DataFrame(grid[1:], columns=grid[0])
-
         with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
             output_path = tmp.name
 
-        df.to_excel(output_path, index=False)
+        # Grid[0] is headers — stream rows straight into a write-only workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        for row in grid:
+            ws.append(row)
+        wb.save(output_path)
         self.logger.info(f"Generated Nestle Excel at {output_path}")
         return output_path
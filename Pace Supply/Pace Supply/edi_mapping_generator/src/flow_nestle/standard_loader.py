@@ -61,10 +61,7 @@ class StandardLoader:
 
                 # Reverse: (SAP_Segment, SAP_Field) → list of mappings
                 if sap_seg and sap_field:
-                    rev_key = (sap_seg, sap_field)
-                    if rev_key not in self._reverse_index:
-                        self._reverse_index[rev_key] = []
-                    self._reverse_index[rev_key].append(mapping_info)
+                    self._reverse_index.setdefault((sap_seg, sap_field), []).append(mapping_info)
 
             self.logger.info(
                 f"Loaded {len(self.mappings)} standard mappings "
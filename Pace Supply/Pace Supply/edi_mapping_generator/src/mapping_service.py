@@ -7,6 +7,7 @@ import shutil
 import tempfile
 import os
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pathlib import Path
 from record_processor import RecordProcessor
@@ -49,7 +50,10 @@ class MappingService:
             auth_header_name=config.get("auth_header_name")
         )
         self.pdf_parser = PdfConstraintExtractor(self.ai_client)
-        self.parallel_executor = ParallelExecutor(max_threads=config.get("max_threads", 5))
+        self.parallel_executor = ParallelExecutor(
+            max_threads=config.get("max_threads", 5),
+            per_task_timeout=self.ai_client.call_budget()
+        )
         # Store sessions in memory for now
         self.sessions: Dict[str, Any] = {}
         
@@ -70,6 +74,7 @@ class MappingService:
             "pdf_path": pdf_path,
             "status": "ready",
             "mappings": {},
+            "mapping_index": {},  # (rec_id, field_name) -> same dict as in "mappings"
             "output_file": None
         }
         return session_id
@@ -201,6 +206,11 @@ class MappingService:
                         full_grid[list_row_idx][2] = ai_vals.get("C")
 
         session["mappings"] = mappings
+        session["mapping_index"] = {
+            (rec_id, field_name): field_map
+            for rec_id, field_maps in mappings.items()
+            for field_name, field_map in field_maps.items()
+        }
         session["grid"] = full_grid
         session["structure"] = structure 
         session["status"] = "completed"
@@ -212,14 +222,17 @@ class MappingService:
         if not session:
             raise ValueError("Invalid Session")
             
-        if rec_id not in session["mappings"]:
-            session["mappings"][rec_id] = {}
-            
+        # Flat index shares dict references with session["mappings"],
+        # so a hit skips the two-level lookup and updates both views
+        index = session.setdefault("mapping_index", {})
+        current = index.get((rec_id, field_name))
+        if current is None:
+            current = session["mappings"].setdefault(rec_id, {}).setdefault(field_name, {})
+            index[(rec_id, field_name)] = current
+
         # Update specific field
         # We expect updates to contain keys 'B', 'C'
-        current = session["mappings"][rec_id].get(field_name, {})
         current.update(updates)
-        session["mappings"][rec_id][field_name] = current
         
         return current
 
@@ -233,6 +246,7 @@ class MappingService:
             "pdf_path": pdf_path,
             "status": "ready",
             "mappings": {},
+            "mapping_index": {},
             "grid": [], # Will populate after generation
             "output_file": None
         }
@@ -245,28 +259,17 @@ class MappingService:
 
         session["status"] = "processing"
         
-        # 1. Extract Constraints
+        # 1. Extract Constraints + 2. Load ERP definitions
+        # Independent I/O — overlap them; the pool is gone before the AI mapping call.
         proc = PdfProcessor856(self.ai_client)
-        segments = proc.extract_mandatory_segments(session["pdf_path"])
-        
-        # 2. Map fields
-        # Removed: self.nestle_service = NestleService(self.ai_client)
-        # Removed: self.engine_856 = MappingEngine856(self.ai_client)
         engine = MappingEngine856(self.ai_client) # Kept local initialization as per original code
-        
-        # Load Definitions - Need to locate file
-        # Assuming typical location
-        # Try both 856 subdir and input dir
-        base_dir = Path(__file__).parent.parent
-        erp_def_path = base_dir / "856" / "856_ERP_Definitions.xlsx"
-        if not erp_def_path.exists():
-             # fallback
-             erp_def_path = base_dir / "input" / "856_ERP_Definitions.xlsx"
-             
-        if not erp_def_path.exists():
-             raise FileNotFoundError(f"856_ERP_Definitions.xlsx not found")
-             
-        engine.load_definitions(str(erp_def_path))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            seg_future = executor.submit(proc.extract_mandatory_segments, session["pdf_path"])
+            def_future = executor.submit(self._resolve_and_load_defs, engine)
+            segments = seg_future.result()
+            def_future.result()
+
         mapping_result = engine.generate_mapping(segments)
         
         session["mappings"] = mapping_result # Store full result { mappings: [...] }
@@ -275,15 +278,17 @@ class MappingService:
         # Frontend expects [[col1, col2...], ...]
         # Mimic new Excel Structure (A-H)
         # Seg, Occ, Element, Type, Source, Hardcode, Meaning, Req
-        grid = []
-        # Header
-        grid.append(["Seg.", "Occ.", "Element", "Type", "Source (Mapping)", "Hardcode", "Meaning", "Req"])
+        mappings_list = mapping_result.get("mappings", [])
+        # Header + one row per mapping (pre-sized, filled by index)
+        grid = [["Seg.", "Occ.", "Element", "Type", "Source (Mapping)", "Hardcode", "Meaning", "Req"]]
+        grid.extend([None] * len(mappings_list))
         
         last_segment = None
         
-        for item in mapping_result.get("mappings", []):
-            segment = item.get("segment", "")
-            element = item.get("element", "")
+        for i, item in enumerate(mappings_list, 1):
+            get = item.get
+            segment = get("segment", "")
+            element = get("element", "")
             
             # Grouping Logic for display
             disp_seg = segment
@@ -295,12 +300,14 @@ class MappingService:
             occ = ""
             
             # Type/Source/Hardcode Login
-            rec = item.get("erp_record", "")
-            field = item.get("erp_field", "")
-            pos = item.get("erp_position", "")
+            rec = get("erp_record", "")
+            field = get("erp_field", "")
+            pos = get("erp_position", "")
+            logic = get("logic", "")
+            description = get("description", "")
             
-            typ = item.get("type", "")
-            hardcode = item.get("hardcode", "")
+            typ = get("type", "")
+            hardcode = get("hardcode", "")
             meaning = ""
             
             # Logic to populate grid columns
@@ -313,32 +320,52 @@ class MappingService:
                 # Translation: Meaning = Desc, Hardcode = Codes, Source = Rec/Pos
                 # If it was originally Source, meaning might just be field name, 
                 # but let's try to use logic/desc if available, fallback to field
-                meaning = item.get("logic", "") + " " + item.get("description", "")
+                meaning = self._join_meaning(logic, description)
                 if not meaning.strip():
                      meaning = field
                      
                 if rec and field:
-                     source = f"{rec}/{pos if pos else '???'}"
+                     source = f"{rec}/{pos or '???'}"
             elif typ == "Constant":
-                meaning = item.get("logic", "") + " " + item.get("description", "")
-                pass 
+                meaning = self._join_meaning(logic, description)
             else:
                  # Sequence, Inherit, Count
-                 meaning = item.get("logic", "")
+                 meaning = logic
                  
             # Fallback if meaning empty
             if not meaning:
-                meaning = item.get("logic", "")
+                meaning = logic
 
             # Persist inferred state to item for editing/export
             req = "Mandatory"
             
-            grid.append([disp_seg, occ, element, typ, source, hardcode, meaning, req])
+            grid[i] = [disp_seg, occ, element, typ, source, hardcode, meaning, req]
             
         session["grid"] = grid
         session["status"] = "completed"
         return {"grid": grid, "mappings": mapping_result}
 
+    @staticmethod
+    def _join_meaning(logic: str, description: str) -> str:
+        """'logic description', without a stray space when either is empty."""
+        if logic and description:
+            return f"{logic} {description}"
+        return logic or description
+
+    def _resolve_and_load_defs(self, engine: MappingEngine856):
+        """Locate 856_ERP_Definitions.xlsx and load it into the engine."""
+        # Try both 856 subdir and input dir
+        base_dir = Path(__file__).parent.parent
+        erp_def_path = base_dir / "856" / "856_ERP_Definitions.xlsx"
+        if not erp_def_path.exists():
+             # fallback
+             erp_def_path = base_dir / "input" / "856_ERP_Definitions.xlsx"
+             
+        if not erp_def_path.exists():
+             raise FileNotFoundError(f"856_ERP_Definitions.xlsx not found")
+             
+        engine.load_definitions(str(erp_def_path))
+
     def create_session_nestle(self, pdf_path: str) -> str:
         """Delegate to Nestle Service"""
         try:
@@ -1,24 +1,38 @@
 """
 Parallel executor module for concurrent record processing.
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Any, Callable
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Dict, List, Any, Callable, Optional
 from logger import get_logger
 
 
 class ParallelExecutor:
     """Manages parallel execution of record processing tasks."""
     
-    def __init__(self, max_threads: int = 5):
+    def __init__(self, max_threads: int = 5, io_bound: bool = True,
+                 per_task_timeout: Optional[float] = None):
         """
         Initialize parallel executor.
         
         Args:
             max_threads: Maximum number of concurrent threads
+            io_bound: True when processors mostly wait on the network (AI calls),
+                      allowing 4x CPU count threads; False caps at CPU count
+            per_task_timeout: Seconds budgeted per record; records still running
+                              past the budget are recorded as failed. Must cover the
+                              AI client's retries and backoff. None (default) disables.
         """
         self.max_threads = max_threads
+        self.io_bound = io_bound
+        self.per_task_timeout = per_task_timeout
         self.logger = get_logger()
     
+    def _pool_size(self, record_count: int) -> int:
+        """Resolve the thread count for a run of record_count records."""
+        cpu_limit = (os.cpu_count() or 1) * (4 if self.io_bound else 1)
+        return max(1, min(self.max_threads, record_count, cpu_limit))
+    
     def process_records_parallel(
         self,
         records: Dict[str, List[Dict[str, Any]]],
@@ -36,10 +50,17 @@ class ParallelExecutor:
         """
         results = {}
         total_records = len(records)
+        pool_size = self._pool_size(total_records)
+        
+        self.logger.info(f"Starting parallel processing of {total_records} records with {pool_size} threads")
         
-        self.logger.info(f"Starting parallel processing of {total_records} records with {self.max_threads} threads")
+        # A hung processor must not hold the run forever: allow per_task_timeout
+        # for each "wave" of pool_size records, then give up on stragglers.
+        waves = -(-total_records // pool_size)
+        deadline = self.per_task_timeout * waves if self.per_task_timeout else None
         
-        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+        executor = ThreadPoolExecutor(max_workers=pool_size)
+        try:
             # Submit all tasks
             future_to_record = {
                 executor.submit(processor_func, record_num, fields): record_num
@@ -47,18 +68,32 @@ class ParallelExecutor:
             }
             
             # Collect results as they complete
+            # Progress is logged roughly every 5% rather than per record
             completed = 0
-            for future in as_completed(future_to_record):
-                record_num = future_to_record[future]
-                completed += 1
-                
-                try:
-                    result = future.result()
-                    results[record_num] = result
-                    self.logger.info(f"Completed record {record_num} ({completed}/{total_records})")
-                except Exception as e:
-                    self.logger.error(f"Record {record_num} failed: {e}")
-                    results[record_num] = {}
+            log_every = max(1, total_records // 20)
+            try:
+                for future in as_completed(future_to_record, timeout=deadline):
+                    record_num = future_to_record[future]
+                    completed += 1
+                    
+                    try:
+                        result = future.result()
+                        results[record_num] = result
+                        if completed % log_every == 0 or completed == total_records:
+                            self.logger.info(f"Completed {completed}/{total_records} records (latest: {record_num})")
+                    except Exception as e:
+                        self.logger.error(f"Record {record_num} failed: {e}")
+                        results[record_num] = {}
+            except FuturesTimeoutError:
+                for future, record_num in future_to_record.items():
+                    if record_num not in results:
+                        future.cancel()
+                        self.logger.error(f"Record {record_num} timed out after {deadline:.0f}s")
+                        results[record_num] = {}
+        finally:
+            # Return without waiting on stragglers and drop queued work. A hung thread
+            # still runs to completion, and concurrent.futures joins it at interpreter exit.
+            executor.shutdown(wait=False, cancel_futures=True)
         
         self.logger.info(f"Parallel processing complete: {len(results)}/{total_records} records processed")
         
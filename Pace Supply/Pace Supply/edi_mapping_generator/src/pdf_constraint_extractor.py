@@ -6,13 +6,62 @@ Provides both mandatory-only extraction (legacy) and full extraction (new).
 Key design: Splits PDF into page-based chunks to avoid massive single-prompt
 extractions that fail due to JSON truncation/corruption.
 """
+import hashlib
 import json
+import os
 import re
-from typing import Dict, Any, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from ai_client import AIClient
 from logger import get_logger
-from pdf_extractor import extract_text_from_pdf
+from pdf_extractor import iter_pdf_pages
+
+try:
+    import orjson
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing
+    # handlers keep working.
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Patterns used on every chunk / AI response — compiled once at import
+_FENCE_RE = re.compile(r'```(?:json)?\s*\n?([\s\S]*?)```')
+_SALVAGE_SEGMENT_RE = re.compile(
+    r'\{[^{}]*"segment"\s*:\s*"[^"]+?"[^{}]*"fields"\s*:\s*\[(?:[^\[\]]*|\[(?:[^\[\]]*|\[[^\[\]]*\])*\])*\][^{}]*\}',
+    re.DOTALL,
+)
+# Typical X12 segment codes (850 and 856/ASN), or any element reference such as
+# "LIN03"/"SN102" — a chunk with none of these is boilerplate (cover, TOC,
+# revision history) and not worth an AI call
+_EDI_SEG_RE = re.compile(
+    r'\b(?:BEG|REF|DTM|N[1-49]|PO[14]|CTT|SE|ST|GS|GE|ISA|IEA|HL|PID|TD[1345]|CTP|SAC|SLN|MSG|IT1|PER|FOB|TXI|CUR'
+    r'|BSN|LIN|SN1|PRF|MAN|PKG|PAL|CLD|ITD|SDQ|AMT)\d{0,2}\b'
+    r'|\b[A-Z][A-Z0-9]{1,2}\d{2}\b'
+)
+
+# Chunk-extraction pool shared by every extractor in the process (MappingService,
+# NestleService, CLI); created on first use so importing this module starts no threads
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _shared_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Return the process-wide chunk-extraction pool, creating it on first call."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdfx")
+        return _EXECUTOR
+
+
+def _default_cache_dir() -> Path:
+    """Per-user cache location for chunk checkpoints (not a shared, world-writable temp dir)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+    root = Path(base) if base else Path.home() / ".cache"
+    return root / "edi_mapping_generator" / "chunk_cache"
 
 
 class PdfConstraintExtractor:
@@ -20,10 +69,70 @@ class PdfConstraintExtractor:
 
     # Pages per chunk — tuned to stay within token limits
     PAGES_PER_CHUNK = 8
+    # Optional cap on pages read per PDF (cut on page boundaries so no page is
+    # split mid-table). None reads the whole guide; pages past a cap are lost.
+    MAX_PAGES: Optional[int] = None
+    # Wall-clock budget (seconds) per chunk, counted from when the chunk starts
+    # running: time queued behind other sessions in the shared pool is free
+    CHUNK_TIMEOUT = 600
+    # How often (seconds) the merge loop re-checks running chunks against CHUNK_TIMEOUT
+    _TIMEOUT_POLL = 5.0
+    # Per-chunk results are checkpointed to disk and reused for this long
+    CHUNK_CACHE_RETENTION_DAYS = 7
+    # Bump when parsing/normalising of chunk results changes, to drop old checkpoints
+    CHECKPOINT_VERSION = 1
+    # Concurrent AI calls for chunk extraction (shared across PDFs)
+    MAX_WORKERS = 5
+    # Chunks must match this to be sent to the AI; override per instance/subclass
+    SEGMENT_KEYWORDS_RE = _EDI_SEG_RE
+
+    # Per-chunk extraction prompt ({chunk_num}, {total_chunks}, {chunk_text}; literal braces doubled).
+    # Both prompts are part of the checkpoint key, so editing them invalidates old results.
+    CHUNK_PROMPT_TEMPLATE = """
+Analyze this section (chunk {chunk_num}/{total_chunks}) of an EDI Implementation Guide.
+
+## TEXT:
+{chunk_text}
+
+## TASK:
+Extract ALL EDI segments and their elements/fields found in this section.
+Include Mandatory (M), Optional (O), and Conditional (C) segments.
 
-    def __init__(self, ai_client: AIClient):
+## OUTPUT — Strict JSON array:
+[
+  {{
+    "segment": "BEG",
+    "description": "Beginning Segment for Purchase Order",
+    "status": "M",
+    "fields": [
+      {{
+        "id": "BEG01",
+        "description": "Transaction Set Purpose Code",
+        "status": "M",
+        "values": ["00"]
+      }}
+    ]
+  }}
+]
+
+## RULES:
+1. Include ALL segments found in this text section.
+2. "status": "M" (Mandatory/Must Use), "O" (Optional), "C" (Conditional), "X" (Not Used).
+3. "values": specific allowed values if listed, else [] for dynamic fields.
+4. If no EDI segments are found in this text, return an empty array: []
+5. Return ONLY valid JSON. No markdown fences, no commentary.
+"""
+    CHUNK_SYSTEM_PROMPT = (
+        "You are an EDI specification parser. "
+        "Extract segment and element definitions from the text. "
+        "Return ONLY a valid JSON array."
+    )
+
+    def __init__(self, ai_client: AIClient, max_pages: Optional[int] = None):
         self.ai_client = ai_client
         self.logger = get_logger()
+        self.max_pages = max_pages if max_pages is not None else self.MAX_PAGES
+        self.cache_dir = _default_cache_dir()
 
     # ------------------------------------------------------------------ #
     #  NEW: Full extraction  (all segments, all elements, all statuses)   #
@@ -37,130 +146,211 @@ class PdfConstraintExtractor:
         self.logger.info(f"[FULL] Extracting ALL segments from PDF: {pdf_path}")
 
         try:
-            pdf_text = extract_text_from_pdf(pdf_path)
+            chunks = list(self._iter_page_chunks(pdf_path))
         except Exception as e:
             self.logger.error(f"Failed to read PDF: {e}")
             return []
 
-        # Split by page markers (if present) or by character chunks
-        chunks = self._split_into_chunks(pdf_text)
         self.logger.info(f"[FULL] Split PDF into {len(chunks)} chunks for extraction")
 
         all_segments: Dict[str, Dict] = {}  # segment_code → merged segment
         total = len(chunks)
+        self._prune_chunk_cache()
+
+        # Guides often repeat the same table/legend across sections; only the
+        # first copy of each chunk is sent (re-merging a duplicate is a no-op)
+        unique_chunks: List[Tuple[int, str, str]] = []  # (idx, digest, chunk)
+        seen_digests = set()
+        for idx, chunk in enumerate(chunks):
+            digest = self._chunk_digest(chunk)
+            if digest not in seen_digests:
+                seen_digests.add(digest)
+                unique_chunks.append((idx, digest, chunk))
+        if len(unique_chunks) < total:
+            self.logger.info(f"[FULL] Skipping {total - len(unique_chunks)} duplicate chunks")
 
         # --- Parallel chunk extraction ---
-        def _process_chunk(args):
-            idx, chunk = args
+        started: Dict[int, float] = {}  # order -> monotonic time the chunk began running
+
+        def _process_chunk(order, idx, digest, chunk):
+            started[order] = time.monotonic()
+            if not self.SEGMENT_KEYWORDS_RE.search(chunk):
+                self.logger.info(f"[FULL] Chunk {idx+1}: no EDI keywords, skipping")
+                return []
+
+            cache_path = self.cache_dir / f"{digest}.json"
+            cached = self._load_chunk_checkpoint(cache_path)
+            if cached is not None:
+                self.logger.info(f"[FULL] Chunk {idx+1}: reused {len(cached)} segments from checkpoint")
+                return cached
+
             self.logger.info(f"[FULL] Processing chunk {idx+1}/{total} ({len(chunk)} chars)...")
             try:
                 segments = self._extract_chunk(chunk, idx + 1, total)
                 self.logger.info(f"[FULL] Chunk {idx+1}: extracted {len(segments)} segments")
+                # Empty results are not checkpointed — they may be parse failures
+                if segments:
+                    self._save_chunk_checkpoint(cache_path, segments)
                 return segments
             except Exception as e:
                 self.logger.error(f"[FULL] Chunk {idx+1} failed: {e}")
                 return []
 
-        with ThreadPoolExecutor(max_workers=min(len(chunks), 5)) as executor:
-            chunk_results = list(executor.map(_process_chunk, enumerate(chunks)))
-
-        # Merge all results
-        for segments in chunk_results:
-            for seg in segments:
-                code = seg.get("segment", "").strip().upper()
-                if not code:
-                    continue
-
-                if code not in all_segments:
-                    all_segments[code] = {
-                        "segment": code,
-                        "description": seg.get("description", ""),
-                        "status": seg.get("status", ""),
-                        "fields": [],
-                    }
-
-                # Merge fields, avoiding duplicates
-                existing_ids = {
-                    f.get("id", "").upper() for f in all_segments[code]["fields"]
-                }
-                for field in seg.get("fields", []):
-                    fid = field.get("id", "").strip().upper()
-                    if fid and fid not in existing_ids:
-                        all_segments[code]["fields"].append(field)
-                        existing_ids.add(fid)
+        executor = _shared_executor(self.MAX_WORKERS)
+        futures = {
+            executor.submit(_process_chunk, order, idx, digest, chunk): order
+            for order, (idx, digest, chunk) in enumerate(unique_chunks)
+        }
+
+        # Merge as results arrive, but in chunk order: a chunk is merged once
+        # every earlier chunk has been, so first-seen descriptions stay stable.
+        ready: Dict[int, List[Dict]] = {}
+        next_order = 0
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=self._TIMEOUT_POLL, return_when=FIRST_COMPLETED)
+            for future in done:
+                ready[futures[future]] = future.result()
+
+            # Give up on chunks that have been running too long (their result counts
+            # as empty); queued ones keep waiting however busy the shared pool is
+            now = time.monotonic()
+            for future in [f for f in pending if now - started.get(futures[f], now) > self.CHUNK_TIMEOUT]:
+                order = futures[future]
+                self.logger.error(
+                    f"[FULL] Chunk {unique_chunks[order][0]+1} timed out after {self.CHUNK_TIMEOUT}s, skipping"
+                )
+                pending.discard(future)
+                ready[order] = []
+
+            while next_order in ready:
+                for seg in ready.pop(next_order):
+                    self._merge_segment_into(all_segments, seg)
+                next_order += 1
 
         result = list(all_segments.values())
+        for entry in result:
+            entry.pop("_field_ids", None)
         total_fields = sum(len(s.get("fields", [])) for s in result)
         self.logger.info(
             f"[FULL] Final: {len(result)} unique segments, {total_fields} total fields"
         )
         return result
 
-    def _split_into_chunks(self, text: str) -> List[str]:
-        """Split PDF text into manageable chunks for AI processing."""
-        # pdf_extractor.py uses "--- Page X ---" markers between pages
-        pages = re.split(r'--- Page \d+ ---', text)
-        pages = [p.strip() for p in pages if p.strip()]
+    @staticmethod
+    def _merge_segment_into(all_segments: Dict[str, Dict], seg: Dict) -> None:
+        """Merge one extracted segment into the accumulator, skipping duplicate fields."""
+        code = seg.get("segment", "").strip().upper()
+        if not code:
+            return
+
+        if code not in all_segments:
+            all_segments[code] = {
+                "segment": code,
+                "description": seg.get("description", ""),
+                "status": seg.get("status", ""),
+                "fields": [],
+                # Running set of merged field IDs; stripped before returning
+                "_field_ids": set(),
+            }
+
+        # Merge fields, avoiding duplicates
+        entry = all_segments[code]
+        field_ids = entry["_field_ids"]
+        for field in seg.get("fields", []):
+            fid = field.get("id", "").strip().upper()
+            if fid and fid not in field_ids:
+                entry["fields"].append(field)
+                field_ids.add(fid)
 
-        if len(pages) <= 1:
-            # Fallback: split by character count
-            CHUNK_SIZE = 8000
-            return [text[i:i+CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
+    # ------------------------------------------------------------------ #
+    #  Chunk checkpoints — survive crashes/retries without re-paying AI   #
+    # ------------------------------------------------------------------ #
 
-        # Group pages into chunks of PAGES_PER_CHUNK
-        chunks = []
-        for i in range(0, len(pages), self.PAGES_PER_CHUNK):
-            chunk = '\n\n'.join(pages[i:i + self.PAGES_PER_CHUNK])
-            if chunk.strip():
-                chunks.append(chunk)
+    def _chunk_digest(self, chunk: str) -> str:
+        """
+        Stable key for a chunk. Output depends on the model, the prompt/schema
+        and our parsing, so all of them are part of the key.
+        """
+        model = getattr(self.ai_client, "model", "") or ""
+        key = "\n".join((
+            str(self.CHECKPOINT_VERSION),
+            model,
+            self.CHUNK_SYSTEM_PROMPT,
+            self.CHUNK_PROMPT_TEMPLATE,
+            chunk,
+        ))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def _load_chunk_checkpoint(self, path: Path) -> Optional[List[Dict]]:
+        """Return checkpointed segments for a chunk, or None if absent/unreadable."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, list) else None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.debug(f"Ignoring unreadable chunk checkpoint {path.name}: {e}")
+            return None
 
-        self.logger.info(f"Split {len(pages)} pages into {len(chunks)} chunks")
-        return chunks if chunks else [text]
+    def _save_chunk_checkpoint(self, path: Path, segments: List[Dict]) -> None:
+        """Atomically write a chunk's segments (temp file + os.replace)."""
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            # Private to the current user: checkpoints are trusted on reload
+            self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(segments, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            self.logger.warning(f"Could not checkpoint chunk {path.name}: {e}")
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
 
-    def _extract_chunk(self, chunk_text: str, chunk_num: int, total_chunks: int) -> List[Dict]:
-        """Extract segments from a single chunk of PDF text."""
-        prompt = f"""
-Analyze this section (chunk {chunk_num}/{total_chunks}) of an EDI Implementation Guide.
+    def _prune_chunk_cache(self) -> int:
+        """Delete checkpoints older than CHUNK_CACHE_RETENTION_DAYS."""
+        if not self.cache_dir.exists():
+            return 0
 
-## TEXT:
-{chunk_text}
+        cutoff_time = time.time() - (self.CHUNK_CACHE_RETENTION_DAYS * 24 * 60 * 60)
+        deleted_count = 0
 
-## TASK:
-Extract ALL EDI segments and their elements/fields found in this section.
-Include Mandatory (M), Optional (O), and Conditional (C) segments.
+        for cache_file in self.cache_dir.iterdir():
+            try:
+                if cache_file.stat().st_mtime < cutoff_time:
+                    cache_file.unlink()
+                    deleted_count += 1
+            except Exception:
+                pass  # Ignore errors during cleanup
 
-## OUTPUT — Strict JSON array:
-[
-  {{
-    "segment": "BEG",
-    "description": "Beginning Segment for Purchase Order",
-    "status": "M",
-    "fields": [
-      {{
-        "id": "BEG01",
-        "description": "Transaction Set Purpose Code",
-        "status": "M",
-        "values": ["00"]
-      }}
-    ]
-  }}
-]
+        return deleted_count
 
-## RULES:
-1. Include ALL segments found in this text section.
-2. "status": "M" (Mandatory/Must Use), "O" (Optional), "C" (Conditional), "X" (Not Used).
-3. "values": specific allowed values if listed, else [] for dynamic fields.
-4. If no EDI segments are found in this text, return an empty array: []
-5. Return ONLY valid JSON. No markdown fences, no commentary.
-"""
-        response = self.ai_client.get_completion(
-            prompt,
-            system_prompt=(
-                "You are an EDI specification parser. "
-                "Extract segment and element definitions from the text. "
-                "Return ONLY a valid JSON array."
-            ),
+    def _iter_page_chunks(self, pdf_path: str) -> Iterator[str]:
+        """
+        Group PDF pages into chunks of PAGES_PER_CHUNK straight from the page
+        stream, so the full document text is never joined and re-split.
+        """
+        batch: List[str] = []
+        for page_text in iter_pdf_pages(pdf_path, max_pages=self.max_pages):
+            page_text = page_text.strip()
+            if not page_text:
+                continue
+            batch.append(page_text)
+            if len(batch) == self.PAGES_PER_CHUNK:
+                yield '\n\n'.join(batch)
+                batch = []
+        if batch:
+            yield '\n\n'.join(batch)
+
+    def _extract_chunk(self, chunk_text: str, chunk_num: int, total_chunks: int) -> List[Dict]:
+        """Extract segments from a single chunk of PDF text."""
+        prompt = self.CHUNK_PROMPT_TEMPLATE.format(
+            chunk_num=chunk_num, total_chunks=total_chunks, chunk_text=chunk_text
         )
+        response = self.ai_client.get_completion(prompt, system_prompt=self.CHUNK_SYSTEM_PROMPT)
         return self._parse_json_list(response)
 
     # ------------------------------------------------------------------ #
@@ -179,7 +369,7 @@ Include Mandatory (M), Optional (O), and Conditional (C) segments.
         """Parse an AI response expected to be a JSON array of segments."""
         try:
             cleaned = self._clean_ai_response(response)
-            result = json.loads(cleaned)
+            result = _json_loads(cleaned)
 
             if isinstance(result, list):
                 return result
@@ -201,45 +391,72 @@ Include Mandatory (M), Optional (O), and Conditional (C) segments.
             self.logger.debug(f"Raw AI response (first 500 chars): {response[:500]}")
             return []
 
-    def _parse_json(self, response: str) -> Any:
-        """Parse JSON from AI response, handling various formats."""
-        try:
-            cleaned = self._clean_ai_response(response)
-            return json.loads(cleaned)
-        except Exception as e:
-            self.logger.warning(f"JSON Parsing failed: {e}")
-            salvaged = self._salvage_partial_json(response)
-            if salvaged:
-                return {"segments": salvaged}
-            self.logger.debug(f"Raw AI response (first 500 chars): {response[:500]}")
-            return {"segments": []}
-
     def _clean_ai_response(self, response: str) -> str:
         """Strip markdown fences and find the JSON structure in the response."""
+        cleaned = self._strip_fences(response)
+
+        # Find outermost JSON structure
+        start, end = self._find_json_span(cleaned)
+        if start != -1:
+            return cleaned[start:end]
+
+        return cleaned
+
+    @staticmethod
+    def _strip_fences(response: str) -> str:
+        """Return the body of the first markdown code fence, if any."""
         cleaned = response.strip()
 
         # Remove markdown code fences
         if "```" in cleaned:
             # Try ```json ... ``` first
-            match = re.search(r'```(?:json)?\s*\n?([\s\S]*?)```', cleaned)
+            match = _FENCE_RE.search(cleaned)
             if match:
                 cleaned = match.group(1).strip()
 
-        # Find outermost JSON structure
-        start_arr = cleaned.find("[")
-        start_obj = cleaned.find("{")
-
-        if start_arr != -1 and (start_obj == -1 or start_arr < start_obj):
-            end = cleaned.rfind("]")
-            if end > start_arr:
-                return cleaned[start_arr:end + 1]
-        elif start_obj != -1:
-            end = cleaned.rfind("}")
-            if end > start_obj:
-                return cleaned[start_obj:end + 1]
-
         return cleaned
 
+    @staticmethod
+    def _find_json_span(text: str) -> Tuple[int, int]:
+        """
+        Locate the first JSON array/object in one pass.
+        Returns (start, end) slice bounds; end is len(text) when the structure
+        is never closed (truncated response), and (-1, -1) if none is found.
+        """
+        start = -1
+        depth = 0
+        in_string = False
+        escape = False
+
+        for i, ch in enumerate(text):
+            if start == -1:
+                if ch == "[" or ch == "{":
+                    start = i
+                    depth = 1
+                continue
+
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                continue
+
+            if ch == '"':
+                in_string = True
+            elif ch == "[" or ch == "{":
+                depth += 1
+            elif ch == "]" or ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return start, i + 1
+
+        if start == -1:
+            return -1, -1
+        return start, len(text)
+
     def _salvage_partial_json(self, response: str) -> List[Dict]:
         """
         Try to extract valid segment objects from a truncated/malformed JSON response.
@@ -249,24 +466,26 @@ Include Mandatory (M), Optional (O), and Conditional (C) segments.
         try:
             cleaned = self._clean_ai_response(response)
 
-            # Strategy 1: Try progressively truncating from the end
-            # Find the last complete object in the array
+            # Strategy 1: Keep every complete top-level object in the array
+            # (single scan, one parse — no re-parsing of shrinking prefixes)
             if cleaned.startswith("["):
-                # Try to close the array at various points
-                for end_pos in range(len(cleaned) - 1, 100, -1):
-                    if cleaned[end_pos] == '}':
-                        attempt = cleaned[:end_pos + 1] + "]"
-                        try:
-                            parsed = json.loads(attempt)
-                            if isinstance(parsed, list):
-                                return parsed
-                        except json.JSONDecodeError:
-                            continue
+                objects = self._scan_top_level_objects(cleaned)
+                if objects:
+                    try:
+                        return json.loads("[" + ",".join(objects) + "]")
+                    except json.JSONDecodeError:
+                        # One bad object shouldn't sink the rest
+                        for obj_str in objects:
+                            try:
+                                segments.append(json.loads(obj_str))
+                            except json.JSONDecodeError:
+                                continue
+                        if segments:
+                            return segments
 
             # Strategy 2: Extract individual segment objects via regex
-            # Look for complete {"segment": "...", ...} blocks
-            pattern = r'\{[^{}]*"segment"\s*:\s*"[^"]+?"[^{}]*"fields"\s*:\s*\[(?:[^\[\]]*|\[(?:[^\[\]]*|\[[^\[\]]*\])*\])*\][^{}]*\}'
-            matches = re.findall(pattern, cleaned, re.DOTALL)
+            # Look for complete {"segment": "...", ...} blocks anywhere in the body
+            matches = _SALVAGE_SEGMENT_RE.findall(self._strip_fences(response))
             for match in matches:
                 try:
                     obj = json.loads(match)
@@ -279,3 +498,42 @@ Include Mandatory (M), Optional (O), and Conditional (C) segments.
             self.logger.debug(f"Salvage attempt failed: {e}")
 
         return segments
+
+    @staticmethod
+    def _scan_top_level_objects(text: str) -> List[str]:
+        """
+        Walk a (possibly truncated) JSON array once and return the source
+        text of each complete object directly inside the outer '['.
+        Brackets inside string literals are ignored.
+        """
+        objects = []
+        depth = 0
+        obj_start = -1
+        in_string = False
+        escape = False
+
+        for i, ch in enumerate(text):
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                continue
+
+            if ch == '"':
+                in_string = True
+            elif ch in "[{":
+                if ch == "{" and depth == 1:
+                    obj_start = i
+                depth += 1
+            elif ch in "]}":
+                depth -= 1
+                if ch == "}" and depth == 1 and obj_start != -1:
+                    objects.append(text[obj_start:i + 1])
+                    obj_start = -1
+                elif depth <= 0:
+                    break
+
+        return objects
@@ -1,44 +1,614 @@
 """
 Record processor module - processes a single record type.
 """
+import asyncio
 import json
+import os
+import re
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Tuple, Union
 from ai_client import AIClient
 from logger import get_logger
 from standard_mappings import apply_standard_mappings
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj: Any, indent: bool = False) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any, indent: bool = False) -> str:
+        return json.dumps(obj, indent=2 if indent else None)
+
+_EMPTY_RECORD_DEF: Mapping[str, Any] = MappingProxyType({})
+_UNDER_RE = re.compile(r'_+')
+# "(" / " " / "-" -> "_", ")" dropped; " (" becomes "__" and is collapsed by _UNDER_RE
+_FIELD_NAME_TRANS = str.maketrans({"(": "_", ")": "", " ": "_", "-": "_"})
+
+
+@lru_cache(maxsize=4096)
+def _normalize_field_name_cached(name: str) -> str:
+    """Normalize Excel field name to match JSON key."""
+    # Example: "Header Identifier (Location Identifier)" -> "Header_Identifier_Location_Identifier"
+    if not name:
+        return ""
+    # One translate pass, then collapse multiple underscores
+    return _UNDER_RE.sub("_", name.translate(_FIELD_NAME_TRANS))
+
+
+# Above this many files the initial parse is spread over threads
+_PARALLEL_PARSE_MIN_FILES = 100
+
+# (id(record_def), targets) -> (record_def, serialized trimmed KB). Shared across
+# processors since record_defs come from the process-wide preload; holding
+# record_def keeps its id from being reused while the entry lives.
+_KB_STR_CACHE: Dict[Tuple[int, Tuple[str, ...]], Tuple[Mapping[str, Any], str]] = {}
+_KB_STR_CACHE_MAX = 512
+
+
+# erp_json_dir -> (directory signature, parsed definitions)
+_RECORD_DEFS: Dict[str, Tuple[Tuple[Tuple[str, int, int], ...], Mapping[str, Mapping[str, Any]]]] = {}
+_RECORD_DEFS_LOCK = threading.Lock()
+
+
+def _record_defs_signature(erp_json_dir: str) -> Tuple[Tuple[str, int, int], ...]:
+    """(name, mtime_ns, size) of every Canonical JSON; changes when a file is added, removed or edited."""
+    try:
+        with os.scandir(erp_json_dir) as entries:
+            stats = [(entry.name, entry.stat()) for entry in entries if entry.name.endswith(".json")]
+    except OSError:
+        return ()
+    return tuple(sorted((name, st.st_mtime_ns, st.st_size) for name, st in stats))
+
+
+def _load_all_record_defs(erp_json_dir: str, refresh: bool = False) -> Mapping[str, Mapping[str, Any]]:
+    """
+    Return every Canonical JSON in the directory, parsed once and shared.
+    
+    With refresh=True the directory is re-stat'ed and re-parsed if any file was
+    added, removed or edited since the last load (RecordProcessor does this on
+    construction, so a long-running server picks up ERP_json changes per run);
+    otherwise the current snapshot is returned without touching the disk.
+    """
+    cached = _RECORD_DEFS.get(erp_json_dir)
+    if cached is not None and not refresh:
+        return cached[1]
+    with _RECORD_DEFS_LOCK:
+        signature = _record_defs_signature(erp_json_dir)
+        cached = _RECORD_DEFS.get(erp_json_dir)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        defs = _parse_record_defs(erp_json_dir)
+        _RECORD_DEFS[erp_json_dir] = (signature, defs)
+        # Field indexes were built from the previous snapshot
+        _field_index_cached.cache_clear()
+        return defs
+
+
+def clear_record_defs_cache() -> None:
+    """Drop the preloaded Canonical JSONs so the next lookup re-reads ERP_json."""
+    with _RECORD_DEFS_LOCK:
+        _RECORD_DEFS.clear()
+        _field_index_cached.cache_clear()
+
+
+def _parse_record_defs(erp_json_dir: str) -> Mapping[str, Mapping[str, Any]]:
+    """
+    Read and parse every Canonical JSON in the directory in one scan.
+    
+    Keyed by file stem ("0010") and by the stem without leading zeros ("10");
+    each definition is a read-only MappingProxyType shared between callers.
+    """
+    logger = get_logger()
+    paths = sorted(Path(erp_json_dir).glob("*.json"))
+
+    def _parse(fpath: Path):
+        try:
+            return MappingProxyType(_json_loads(fpath.read_bytes()))
+        except Exception as e:
+            logger.error(f"Error loading {fpath}: {e}")
+            return None
+
+    if len(paths) > _PARALLEL_PARSE_MIN_FILES:
+        with ThreadPoolExecutor() as pool:
+            parsed = list(pool.map(_parse, paths))
+    else:
+        parsed = [_parse(fpath) for fpath in paths]
+
+    defs: Dict[str, Mapping[str, Any]] = {}
+    for fpath, record_def in zip(paths, parsed):
+        if record_def is not None:
+            defs[fpath.stem] = record_def
+    for stem in list(defs):
+        defs.setdefault(stem.lstrip("0") or "0", defs[stem])
+    logger.debug(f"Preloaded {len(paths)} record definitions from {erp_json_dir}")
+    return MappingProxyType(defs)
+
+
+def _load_record_json_cached(erp_json_dir: str, record_num: str) -> Mapping[str, Any]:
+    """Look up one record's Canonical JSON in the preloaded directory (exact, then padded)."""
+    defs = _load_all_record_defs(erp_json_dir)
+    return defs.get(record_num) or defs.get(record_num.zfill(4)) or _EMPTY_RECORD_DEF
+
+
+@lru_cache(maxsize=256)
+def _field_index_cached(erp_json_dir: str, record_num: str) -> Mapping[str, Any]:
+    """
+    Index a record's "fields" by both the raw JSON key and its normalized form,
+    so a target field resolves with a single lookup.
+    """
+    fields = _load_record_json_cached(erp_json_dir, record_num).get("fields") or {}
+    index = {}
+    for key, fdef in fields.items():
+        index.setdefault(_normalize_field_name_cached(key), fdef)
+    # Raw keys win over a colliding normalized form
+    index.update(fields)
+    return MappingProxyType(index)
+
+
+def _constraints_by_segment(constraints: Any) -> Dict[str, Any]:
+    """
+    Normalise PDF constraints to the {"segments": {SEG: rules}} shape used here.
+    
+    PdfConstraintExtractor.extract_constraints returns a list of segment entries
+    ({"segment": "BEG", "status": ..., "fields": [...]}); mappings pass through.
+    """
+    if not constraints:
+        return {}
+    if isinstance(constraints, Mapping):
+        return dict(constraints)
+    segments: Dict[str, Any] = {}
+    for entry in constraints:
+        if isinstance(entry, Mapping) and entry.get("segment"):
+            segments.setdefault(entry["segment"], entry)
+    return {"segments": segments}
+
 
 class RecordProcessor:
     """Processes a single record type to generate mappings using Canonical JSONs."""
     
-    def __init__(self, ai_client: AIClient, edi_parsed: Dict[str, List[List[str]]], constraints: Dict[str, Any] = None):
+    def __init__(self, ai_client: AIClient, edi_parsed: Dict[str, List[List[str]]],
+                 constraints: Union[Dict[str, Any], List[Dict[str, Any]], None] = None):
         """
         Initialize record processor.
         
         Args:
             ai_client: Initialized AI client (used for fallbacks if needed)
             edi_parsed: Parsed EDI structure { "SEG": [["el1", ...]] }
-            constraints: Extracted constraints from PDF
+            constraints: Extracted constraints from PDF, either the segment list from
+                         PdfConstraintExtractor.extract_constraints or {"segments": {...}}
         """
         self.ai_client = ai_client
         self.edi_parsed = edi_parsed
-        self.constraints = constraints or {}
+        # Read-only: filtered views of it are cached per record definition
+        self.constraints = MappingProxyType(_constraints_by_segment(constraints))
         self.logger = get_logger()
         self.erp_json_dir = Path(__file__).parent / "ERP_json"
+        # One directory scan up front (shared across processors, re-read if ERP_json changed)
+        _load_all_record_defs(str(self.erp_json_dir), refresh=True)
+        # edi_parsed is fixed for the processor's lifetime; summarize it once
+        self._sample_str = self._sample_data_str()
+        # Per-field lookups in _map_x12_field
+        self._first_occ = {seg: occs[0] for seg, occs in self.edi_parsed.items() if occs}
+        segments = self.constraints.get("segments") if isinstance(self.constraints, Mapping) else None
+        self._seg_rules: Mapping[str, Any] = segments if isinstance(segments, Mapping) else {}
+        # (segment, element_idx) -> element rules, flattened once. Only the
+        # {"elements": {"01": {...}}} form carries per-element rules; extracted
+        # segment entries (status/fields) simply contribute none.
+        self._elem_rules: Dict[Tuple[str, str], Mapping[str, Any]] = {}
+        for seg, rules in self._seg_rules.items():
+            elements = rules.get("elements") if isinstance(rules, Mapping) else None
+            if isinstance(elements, Mapping):
+                for idx, elem_rules in elements.items():
+                    if isinstance(elem_rules, Mapping):
+                        self._elem_rules[(seg, idx)] = elem_rules
+        # id(record_def) -> (record_def, filtered constraints); holding record_def keeps the id valid
+        self._filter_cache: Dict[int, Tuple[Mapping[str, Any], Dict[str, Any]]] = {}
+        # id(record_def) -> (record_def, serialized filtered constraints)
+        self._constraints_str_cache: Dict[int, Tuple[Mapping[str, Any], str]] = {}
     
-    def process_record(self, record_num: str, fields: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # System prompt shared by the sync and async Phase 3 paths
+    PHASE3_SYSTEM_PROMPT = "You are an EDI Mapping Engine. Output strict JSON only. Do not invent fields."
+
+    # Column/validation/logic rules shared by the single and batched Phase 3 prompts
+    _PHASE3_RULES = (
+        "## COLUMN DEFINITIONS (CRITICAL)",
+        "",
+        "**Column B (SOURCE)**: Where to fetch the value FROM the EDI X12 file.",
+        "  - Format: SegmentElement (e.g., 'BEG03' means element 03 of BEG segment)",
+        "  - Examples: 'GS02', 'BEG03', 'REF02', 'N102', 'PO101'",
+        "  - If the field is NOT from EDI (constant/fixed), leave B EMPTY.",
+        "  - If logic depends on CONDITIONAL fields (see STEP 5), list ALL referenced segments here (e.g., 'N1, N2, N3').",
+        "",
+        "**Column C (VALUE)**: The FIXED/CONSTANT value if not derived from EDI.",
+        "  - Use this ONLY when 'value_source' is 'constant', 'fixed_by_layout', 'oracle_standard', 'erp_constant' etc.",
+        "  - Put the actual value here (e.g., '0010', 'CT', 'CTL', 'X12', '850').",
+        "  - If the field IS from EDI (Column B populated), leave C EMPTY.",
+        "",
+        "**Validation Warning (validation_warning)**:",
+        "  - Analyze the provided Logic Description vs Vendor Constraints.",
+        "  - If the logic depends on specific values (e.g., 'BEG02 = DS'), check if the Vendor Spec allows OTHER values (e.g., 'BG', 'SA').",
+        "  - If the logic does NOT cover all allowed values from the Vendor Spec, output a warning string here.",
+        "  - Example: 'Vendor Spec allows BEG02 values [DS, BG, SA] but logic only covers [DS].'",
+        "  - If ok, leave null or empty string.",
+        "",
+        "### STEP 5: HANDLE SPECIFIC LOGIC (Column J)",
+        "For each target field in request, I have provided 'Logic Description' if available.",
+        "1. IF LOGIC DESCRIPTION IS EMPTY or whitespace, IGNORE IT. Use the default mapping from the Knowledge Base (x12_mapping).",
+        "2. If Logic Description says 'Constant X', put X in Column C, clear B.",
+        "3. If Logic Description has conditions (e.g., 'If BEG02=DS...'):",
+        "   - Extract all segments mentioned in the RESULT of the condition (e.g. 'take from N104' -> B='N104').",
+        "   - If multiple conditions lead to different segments, list them all in B (e.g. 'N1, N2, N3').",
+        "   - Perform the Validation Check described above.",
+        "",
+    )
+
+    # Single-record Phase 3 prompt, filled with format_map in _build_phase3_prompt.
+    # Literal braces (JSON schema) are doubled.
+    _PROMPT_TEMPLATE = "\n".join([
+        "You are an expert EDI Integration Architect.",
+        "We are working on an automation to prepare an X12_to_Oracle mapping file.",
+        "Your task is to prepare this mapping for a specific Record Group.",
+        "",
+        "### CONTEXT: Record {record_num}",
+        "Target Fields to Map: {target_fields}",
+        "Logic Descriptions (Column J): {logic_map}",
+        "",
+        "### STEP 1: CONSULT KNOWLEDGE BASE (Source of Truth)",
+        "The following JSON defines the available fields and their rules.",
+        "CRITICAL: The 'Target Fields' above might use slightly different naming or casing than the keys in this JSON.",
+        "You must SEARCH this JSON for the matching definition. Keys might be nested.",
+        "- If a field matches 'record_number', use the root 'record_number' or related constant.",
+        "- If a field matches a key inside 'record_classification', use that.",
+        "- Use 'semantic similarity' to resolve Excel field names to JSON keys.",
+        "",
+        "#### KNOWLEDGE BASE JSON:",
+        "{kb}",
+        "",
+        "### STEP 2: CONSULT EXTRA RULES (From PDF)",
+        "These are specific validation rules extracted from the Vendor Specification.",
+        "{constraints}",
+        "",
+        "### STEP 3: CHECK EDI DATA (Sample File)",
+        "Confirm availability of segments in the actual file:",
+        "{sample}",
+        "",
+        "### STEP 4: GENERATE OUTPUT",
+        "Based on the above, generate the mapping JSON for the requested Target Fields.",
+        "Return a JSON object where keys are the specific Field Names from the 'Target Fields' list.",
+        'Values must be an object with keys: "B", "C".',
+        "",
+        *_PHASE3_RULES,
+        "## JSON SCHEMA",
+        "{{",
+        '  "Field_Name": {{',
+        '      "B": "EDI Source (e.g., BEG03) or empty",',
+        '      "C": "Fixed Value or empty",',
+        '      "validation_warning": "Warning message or null"',
+        "  }}",
+        "}}",
+        "",
+        "IMPORTANT: Do NOT invent mappings. Only use what the Knowledge Base provides.",
+        "Strict JSON only."
+    ])
+
+    # Stream Phase 3 answers and stop reading once the JSON object closes;
+    # set False for endpoints without SSE support
+    STREAM_RESPONSES = True
+
+    # Batched Phase 3 packing limits
+    BATCH_CONTEXT_TOKENS = 100000   # prompt budget per batched call (~4 chars/token)
+    BATCH_RESPONSE_RESERVE = 4000   # headroom kept for instructions + answer
+    BATCH_MAX_FIELDS = 60           # keep the combined JSON answer within max_tokens
+    
+    def process_record(self, record_num: str, fields: List[Dict[str, Any]], force: bool = False) -> Dict[str, Dict[str, Any]]:
         """
         Phase 3: Process a single record type using LLM to generate final Excel values.
         
         Args:
             record_num: Record number (e.g., "1000")
             fields: List of fields from the Excel structure needing mapping.
+            force: Call the LLM even if no field resolves in the Knowledge Base.
         
         Returns:
             Dictionary with field mappings matching the Excel columns (B, C, D, E).
         """
+        prepared = self._prepare_record(record_num, fields)
+        if prepared is None:
+            return {}
+        prompt_fields, unique_targets, record_def = prepared
+        if not force and not self._has_kb_hits(record_num, unique_targets, record_def):
+            return {f["field_name"]: {} for f in fields}
+
+        try:
+            # Pass unique normalized fields to prompt
+            prompt = self._build_phase3_prompt(record_num, prompt_fields, record_def)
+            
+            if self.STREAM_RESPONSES:
+                response = self._stream_json_response(prompt)
+            else:
+                response = self.ai_client.get_completion(
+                    prompt,
+                    system_prompt=self.PHASE3_SYSTEM_PROMPT
+                )
+            
+            return self._fan_out_response(response, fields, unique_targets)
+            
+        except Exception as e:
+            self.logger.error(f"LLM failure for record {record_num}: {e}\\n{traceback.format_exc()}")
+            return {}
+
+    def _stream_json_response(self, prompt: str) -> str:
+        """
+        Stream the Phase 3 completion, returning the first top-level JSON object
+        as soon as it has closed instead of waiting for the rest of the answer.
+        Falls back to the full streamed text if no complete object is found.
+        """
+        parts: List[str] = []
+        start = -1  # offset of the candidate object's "{" in the joined text
+        offset = 0  # length of the text before the current chunk
+        depth = 0
+        in_string = escape = False
+        stream = self.ai_client.stream_completion(prompt, system_prompt=self.PHASE3_SYSTEM_PROMPT)
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                for i, ch in enumerate(chunk):
+                    if depth == 0:
+                        # Nothing is tracked until an object opens (skips prose/fences)
+                        if ch == '{':
+                            depth, start = 1, offset + i
+                        continue
+                    if escape:
+                        escape = False
+                    elif ch == '\\':
+                        escape = in_string
+                    elif ch == '"':
+                        in_string = not in_string
+                    elif in_string:
+                        continue
+                    elif ch == '{':
+                        depth += 1
+                    elif ch == '}':
+                        depth -= 1
+                        if depth == 0:
+                            candidate = "".join(parts)[start:offset + i + 1]
+                            try:
+                                _json_loads(candidate)
+                                return candidate
+                            except ValueError:
+                                pass  # braces in prose, keep scanning
+                offset += len(chunk)
+        finally:
+            # Closing the generator drops the HTTP stream early
+            stream.close()
+        return "".join(parts)
+
+    async def aprocess_record(self, record_num: str, fields: List[Dict[str, Any]], force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Async variant of process_record; awaits the LLM call instead of blocking a thread."""
+        # Record definitions were preloaded in __init__, so preparing is pure in-memory work
+        prepared = self._prepare_record(record_num, fields)
+        if prepared is None:
+            return {}
+        prompt_fields, unique_targets, record_def = prepared
+        if not force and not self._has_kb_hits(record_num, unique_targets, record_def):
+            return {f["field_name"]: {} for f in fields}
+
+        try:
+            prompt = self._build_phase3_prompt(record_num, prompt_fields, record_def)
+            
+            response = await self.ai_client.aget_completion(
+                prompt,
+                system_prompt=self.PHASE3_SYSTEM_PROMPT
+            )
+            
+            return self._fan_out_response(response, fields, unique_targets)
+            
+        except Exception as e:
+            self.logger.error(f"LLM failure for record {record_num}: {e}\\n{traceback.format_exc()}")
+            return {}
+
+    async def aprocess_all(self, record_to_fields: Dict[str, List[Dict[str, Any]]],
+                           max_concurrency: int = 10) -> Dict[str, Dict[str, Any]]:
+        """
+        Process every record concurrently on one event loop.
+        
+        Args:
+            record_to_fields: Dictionary mapping record numbers to their fields
+            max_concurrency: Maximum in-flight LLM requests (respect the endpoint's rate limit)
+        
+        Returns:
+            Dictionary mapping record numbers to their field mappings
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def _bounded(record_num, fields):
+            async with semaphore:
+                return await self.aprocess_record(record_num, fields)
+
+        record_nums = list(record_to_fields)
+        self.logger.info(f"Processing {len(record_nums)} records (async, up to {max_concurrency} concurrent)")
+        try:
+            results = await asyncio.gather(
+                *(_bounded(r, record_to_fields[r]) for r in record_nums),
+                return_exceptions=True
+            )
+        finally:
+            await self.ai_client.aclose()
+
+        all_mappings = {}
+        for record_num, result in zip(record_nums, results):
+            if isinstance(result, BaseException):
+                self.logger.error(f"Error processing record {record_num}: {result}")
+                all_mappings[record_num] = {}
+            else:
+                all_mappings[record_num] = result
+        return all_mappings
+
+    def process_records_batched(self, records: Dict[str, List[Dict[str, Any]]],
+                                batch_size: int = 5) -> Dict[str, Dict[str, Any]]:
+        """
+        Process records with several record groups packed into each LLM call.
+        
+        Records are packed greedily (up to batch_size per call, within the
+        BATCH_* token/field limits). Any record missing from a batched answer
+        is retried on its own via process_record.
+        
+        Args:
+            records: Dictionary mapping record numbers to their fields
+            batch_size: Maximum record groups per LLM call
+        
+        Returns:
+            Dictionary mapping record numbers to their field mappings
+        """
+        all_mappings: Dict[str, Dict[str, Any]] = {}
+        prepared = {}
+        for record_num, fields in records.items():
+            p = self._prepare_record(record_num, fields)
+            if p is None:
+                all_mappings[record_num] = {}
+            elif not self._has_kb_hits(record_num, p[1], p[2]):
+                all_mappings[record_num] = {f["field_name"]: {} for f in fields}
+            else:
+                prepared[record_num] = p
+
+        for batch in self._pack_batches(prepared, batch_size):
+            per_record = {}
+            try:
+                prompt = self._build_phase3_prompt_batch({r: prepared[r] for r in batch})
+                response = self.ai_client.get_completion(
+                    prompt,
+                    system_prompt=self.PHASE3_SYSTEM_PROMPT
+                )
+                per_record = self._parse_batched_response(response, batch)
+            except Exception as e:
+                self.logger.error(f"Batched LLM failure for records {batch}: {e}")
+
+            for record_num in batch:
+                if record_num in per_record:
+                    all_mappings[record_num] = self._fan_out_mappings(per_record[record_num], records[record_num])
+                else:
+                    self.logger.warning(f"Record {record_num} missing from batched response; retrying alone")
+                    all_mappings[record_num] = self.process_record(record_num, records[record_num])
+
+        # Keep the caller's record order
+        return {record_num: all_mappings[record_num] for record_num in records}
+
+    def _pack_batches(self, prepared: Dict[str, Tuple], batch_size: int) -> List[List[str]]:
+        """Greedily group record numbers so each batch stays within the BATCH_* limits."""
+        budget = self.BATCH_CONTEXT_TOKENS - self.BATCH_RESPONSE_RESERVE
+        batches: List[List[str]] = []
+        current: List[str] = []
+        tokens = fields = 0
+        for record_num, (_, unique_targets, record_def) in prepared.items():
+            est_tokens = len(str(record_def)) // 4
+            if current and (
+                len(current) >= batch_size
+                or tokens + est_tokens > budget
+                or fields + len(unique_targets) > self.BATCH_MAX_FIELDS
+            ):
+                batches.append(current)
+                current, tokens, fields = [], 0, 0
+            current.append(record_num)
+            tokens += est_tokens
+            fields += len(unique_targets)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _build_phase3_prompt_batch(self, batch: Dict[str, Tuple]) -> str:
+        """Construct one Phase 3 prompt covering several record groups."""
+        prompt_parts = [
+            "You are an expert EDI Integration Architect.",
+            "We are working on an automation to prepare an X12_to_Oracle mapping file.",
+            f"Your task is to prepare this mapping for {len(batch)} Record Groups at once.",
+            "Each record below has its own Target Fields, Knowledge Base and extra rules — never mix them.",
+            "",
+        ]
+
+        for record_num, (prompt_fields, _, record_def) in batch.items():
+            logic_map = {}
+            for f in prompt_fields:
+                l = f.get('logic_desc', '')
+                if l and str(l).strip():
+                    logic_map[f['field_name']] = str(l).strip()
+
+            prompt_parts.extend([
+                f"### RECORD {record_num}",
+                f"Target Fields to Map: {_json_dumps([f['field_name'] for f in prompt_fields])}",
+                f"Logic Descriptions (Column J): {_json_dumps(logic_map)}",
+                "",
+                f"#### KNOWLEDGE BASE JSON (Record {record_num}, Source of Truth):",
+                self._knowledge_base_str(record_def, prompt_fields),
+                "",
+                f"#### EXTRA RULES (From PDF, Record {record_num}):",
+                self._constraints_str(record_def),
+                "",
+            ])
+
+        prompt_parts.extend([
+            "### CHECK EDI DATA (Sample File)",
+            "Confirm availability of segments in the actual file:",
+            self._sample_str,
+            "",
+            "### GENERATE OUTPUT",
+            "For EACH record, resolve its Target Fields against THAT record's Knowledge Base",
+            "(names may differ slightly in casing/format — use semantic similarity).",
+            "Return ONE JSON object whose top-level keys are the record numbers above,",
+            "each holding an object keyed by that record's Target Field names.",
+            'Field values must be an object with keys: "B", "C".',
+            "",
+            *self._PHASE3_RULES,
+            "## JSON SCHEMA",
+            "{",
+            '  "<record_num>": {',
+            '    "Field_Name": {',
+            '        "B": "EDI Source (e.g., BEG03) or empty",',
+            '        "C": "Fixed Value or empty",',
+            '        "validation_warning": "Warning message or null"',
+            "    }",
+            "  }",
+            "}",
+            "",
+            "IMPORTANT: Do NOT invent mappings. Only use what the Knowledge Base provides.",
+            "Strict JSON only."
+        ])
+        return "\n".join(prompt_parts)
+
+    def _parse_batched_response(self, response: str, record_nums: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Split a batched answer into per-record mappings (records absent/malformed are omitted)."""
+        text = response.strip()
+        start = text.find("{")
+        end = text.rfind("}")
+        if start == -1 or end == -1:
+            raise ValueError("No JSON object in batched response")
+        result = _json_loads(text[start:end + 1])
+        return {r: result[r] for r in record_nums if isinstance(result.get(r), dict)}
+
+    def _sample_data_str(self) -> str:
+        """Summarize the parsed sample EDI for the prompt."""
+        if not self.edi_parsed:
+            return "No Sample EDI File Provided."
+        return "\n".join(
+            f"{seg}: {len(occs)} occurrences. Example: {occs[0] if occs else 'empty'}"
+            for seg, occs in self.edi_parsed.items()
+        )
+
+    def _prepare_record(self, record_num: str, fields: List[Dict[str, Any]]) -> Optional[Tuple[List[Dict[str, Any]], List[str], Dict[str, Any]]]:
+        """
+        Load the record definition and dedupe fields for the prompt.
+        
+        Returns:
+            (prompt_fields, unique_targets, record_def), or None if no Canonical JSON exists
+        """
         field_names = [f["field_name"] for f in fields]
         self.logger.info(f"Processing record {record_num} with {len(field_names)} fields (Phase 3)")
         
@@ -46,7 +616,7 @@ class RecordProcessor:
         record_def = self._load_record_json(record_num)
         if not record_def:
             self.logger.warning(f"No Canonical JSON found for record {record_num}")
-            return {}
+            return None
 
         # 2. Normalize and Deduplicate Fields for Prompt
         # Map normalized_name -> list of original_field_dicts
@@ -58,6 +628,11 @@ class RecordProcessor:
             norm_map[norm].append(f)
             
         unique_targets = list(norm_map.keys())
+
+        field_index = self._field_index(record_num)
+        unresolved = [norm for norm in unique_targets if norm not in field_index]
+        if unresolved:
+            self.logger.debug(f"Record {record_num}: no Knowledge Base definition for {unresolved}")
         
         # Create a simplified list of fields for the PROMPT using normalized names
         # We pick the first occurrence's logic description, or merge them?
@@ -84,61 +659,60 @@ class RecordProcessor:
                 "logic_desc": best_logic
             })
 
-        try:
-            # Pass unique normalized fields to prompt
-            prompt = self._build_phase3_prompt(record_num, prompt_fields, record_def)
-            
-            response = self.ai_client.get_completion(
-                prompt,
-                system_prompt="You are an EDI Mapping Engine. Output strict JSON only. Do not invent fields."
-            )
-            
-            # Parse response expecting normalized keys
-            unique_mappings = self.ai_client._parse_response(response, unique_targets)
-            
-            # 3. Fan-out results to original field names
-            final_mappings = {}
-            for original_field in fields:
-                name = original_field["field_name"]
-                norm = self._normalize_field_name(name)
-                if norm in unique_mappings:
-                    final_mappings[name] = unique_mappings[norm]
-                else:
-                    final_mappings[name] = {} # Should not happen if _parse_response fills defaults
-            
-            return final_mappings
-            
-        except Exception as e:
-            self.logger.error(f"LLM failure for record {record_num}: {e}\\n{traceback.format_exc()}")
-            return {}
+        return prompt_fields, unique_targets, record_def
+
+    def _has_kb_hits(self, record_num: str, unique_targets: List[str], record_def: Mapping[str, Any]) -> bool:
+        """
+        True if at least one target resolves in the Knowledge Base — a field key
+        (raw or normalized), a top-level key, or a record_classification key.
+        With zero hits the LLM can only return empty mappings, so skip the call.
+        """
+        field_index = self._field_index(record_num)
+        other_keys = {k.lower() for k in record_def}
+        classification = record_def.get("record_classification")
+        if isinstance(classification, dict):
+            other_keys.update(k.lower() for k in classification)
+
+        if any(norm in field_index or norm.lower() in other_keys for norm in unique_targets):
+            return True
+        self.logger.warning(
+            f"Record {record_num}: none of {len(unique_targets)} fields found in the Knowledge Base; skipping LLM call"
+        )
+        return False
+
+    def _fan_out_response(self, response: str, fields: List[Dict[str, Any]], unique_targets: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Parse the LLM response (normalized keys) and fan results out to the original field names."""
+        # Parse response expecting normalized keys
+        unique_mappings = self.ai_client._parse_response(response, unique_targets)
+        return self._fan_out_mappings(unique_mappings, fields)
+
+    def _fan_out_mappings(self, unique_mappings: Dict[str, Any], fields: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Copy mappings keyed by normalized name back onto every original field name."""
+        # 3. Fan-out results to original field names
+        final_mappings = {}
+        for original_field in fields:
+            name = original_field["field_name"]
+            norm = self._normalize_field_name(name)
+            if norm in unique_mappings:
+                final_mappings[name] = unique_mappings[norm]
+            else:
+                final_mappings[name] = {} # Should not happen if _parse_response fills defaults
+        
+        return final_mappings
 
     def _build_phase3_prompt(self, record_num: str, fields: List[Dict[str, Any]], record_def: Dict[str, Any]) -> str:
 
         """Construct the prompt for Phase 3 including full JSON definition for semantic matching."""
         
         # Prepare Knowledge Base (JSON)
-        # We dump the entire JSON content so the LLM can see all keys and structure
-        knowledge_base_str = json.dumps(record_def, indent=2)
+        # Metadata plus only the requested fields (see _trim_record_def)
+        knowledge_base_str = self._knowledge_base_str(record_def, fields)
 
         # Prepare Constraints (PDF) - Filtered
-        filtered_constraints = self._filter_constraints_for_record(record_def)
-        constraints_str = json.dumps(filtered_constraints, indent=2)
+        constraints_str = self._constraints_str(record_def)
 
         # Prepare Sample Data (EDI) - Simplified
-        sample_str = "No Sample EDI File Provided."
-        if self.edi_parsed:
-            sample_str = ""
-            for seg, occs in self.edi_parsed.items():
-                sample_str += f"{seg}: {len(occs)} occurrences. Example: {occs[0] if occs else 'empty'}\\n"
-
-        prompt_parts = [
-            "You are an expert EDI Integration Architect.",
-            "We are working on an automation to prepare an X12_to_Oracle mapping file.",
-            "Your task is to prepare this mapping for a specific Record Group.",
-            "",
-            f"### CONTEXT: Record {record_num}",
-            f"Target Fields to Map: {json.dumps([f['field_name'] for f in fields])}",
-        ]
+        sample_str = self._sample_str
 
         # Prepare Logic Map - Filter out empty strings to avoid ambiguity
         logic_map = {}
@@ -149,101 +723,80 @@ class RecordProcessor:
         
         # DEBUG: Log logic map
         if record_num == "0010":
-            self.logger.info(f"Prompt Logic Map [0010]: {json.dumps(logic_map)}")
+            self.logger.info(f"Prompt Logic Map [0010]: {_json_dumps(logic_map)}")
 
-        prompt_parts.append(f"Logic Descriptions (Column J): {json.dumps(logic_map)}")
-        prompt_parts.append("")
-        
-        prompt_parts.extend([
-            "### STEP 1: CONSULT KNOWLEDGE BASE (Source of Truth)",
-            "The following JSON defines the available fields and their rules.",
-            "CRITICAL: The 'Target Fields' above might use slightly different naming or casing than the keys in this JSON.",
-            "You must SEARCH this JSON for the matching definition. Keys might be nested.",
-            "- If a field matches 'record_number', use the root 'record_number' or related constant.",
-            "- If a field matches a key inside 'record_classification', use that.",
-            "- Use 'semantic similarity' to resolve Excel field names to JSON keys.",
-            "",
-            "#### KNOWLEDGE BASE JSON:",
-            knowledge_base_str,
-            "",
-            "### STEP 2: CONSULT EXTRA RULES (From PDF)",
-            "These are specific validation rules extracted from the Vendor Specification.",
-            constraints_str,
-            "",
-            "### STEP 3: CHECK EDI DATA (Sample File)",
-            "Confirm availability of segments in the actual file:",
-            sample_str,
-            "",
-            "### STEP 4: GENERATE OUTPUT",
-            "Based on the above, generate the mapping JSON for the requested Target Fields.",
-            "Return a JSON object where keys are the specific Field Names from the 'Target Fields' list.",
-            'Values must be an object with keys: "B", "C".',
-            "",
-            "## COLUMN DEFINITIONS (CRITICAL)",
-            "",
-            "**Column B (SOURCE)**: Where to fetch the value FROM the EDI X12 file.",
-            "  - Format: SegmentElement (e.g., 'BEG03' means element 03 of BEG segment)",
-            "  - Examples: 'GS02', 'BEG03', 'REF02', 'N102', 'PO101'",
-            "  - If the field is NOT from EDI (constant/fixed), leave B EMPTY.",
-            "  - If logic depends on CONDITIONAL fields (see STEP 5), list ALL referenced segments here (e.g., 'N1, N2, N3').",
-            "",
-            "**Column C (VALUE)**: The FIXED/CONSTANT value if not derived from EDI.",
-            "  - Use this ONLY when 'value_source' is 'constant', 'fixed_by_layout', 'oracle_standard', 'erp_constant' etc.",
-            "  - Put the actual value here (e.g., '0010', 'CT', 'CTL', 'X12', '850').",
-            "  - If the field IS from EDI (Column B populated), leave C EMPTY.",
-            "",
-            "**Validation Warning (validation_warning)**:",
-            "  - Analyze the provided Logic Description vs Vendor Constraints.",
-            "  - If the logic depends on specific values (e.g., 'BEG02 = DS'), check if the Vendor Spec allows OTHER values (e.g., 'BG', 'SA').",
-            "  - If the logic does NOT cover all allowed values from the Vendor Spec, output a warning string here.",
-            "  - Example: 'Vendor Spec allows BEG02 values [DS, BG, SA] but logic only covers [DS].'",
-            "  - If ok, leave null or empty string.",
-            "",
-            "### STEP 5: HANDLE SPECIFIC LOGIC (Column J)",
-            "For each target field in request, I have provided 'Logic Description' if available.",
-            "1. IF LOGIC DESCRIPTION IS EMPTY or whitespace, IGNORE IT. Use the default mapping from the Knowledge Base (x12_mapping).",
-            "2. If Logic Description says 'Constant X', put X in Column C, clear B.",
-            "3. If Logic Description has conditions (e.g., 'If BEG02=DS...'):",
-            "   - Extract all segments mentioned in the RESULT of the condition (e.g. 'take from N104' -> B='N104').",
-            "   - If multiple conditions lead to different segments, list them all in B (e.g. 'N1, N2, N3').",
-            "   - Perform the Validation Check described above.",
-            "",
-            "## JSON SCHEMA",
-            "{",
-            '  "Field_Name": {',
-            '      "B": "EDI Source (e.g., BEG03) or empty",',
-            '      "C": "Fixed Value or empty",',
-            '      "validation_warning": "Warning message or null"',
-            "  }",
-            "}",
-            "",
-            "IMPORTANT: Do NOT invent mappings. Only use what the Knowledge Base provides.",
-            "Strict JSON only."
-        ])
-        
+        return self._PROMPT_TEMPLATE.format_map({
+            "record_num": record_num,
+            "target_fields": _json_dumps([f['field_name'] for f in fields]),
+            "logic_map": _json_dumps(logic_map),
+            "kb": knowledge_base_str,
+            "constraints": constraints_str,
+            "sample": sample_str,
+        })
+
+    @staticmethod
+    def _normalize_field_name(name: str) -> str:
+        """Normalize Excel field name to match JSON key (memoized; names recur across records)."""
+        return _normalize_field_name_cached(name)
 
+    def _knowledge_base_str(self, record_def: Mapping[str, Any], fields: List[Dict[str, Any]]) -> str:
+        """Serialized (trimmed) Knowledge Base for these targets, reused across calls and processors."""
+        targets = tuple(sorted({self._normalize_field_name(f["field_name"]) for f in fields}))
+        key = (id(record_def), targets)
+        cached = _KB_STR_CACHE.get(key)
+        if cached is not None and cached[0] is record_def:
+            return cached[1]
+        kb_str = _json_dumps(self._trim_record_def(record_def, fields), indent=True)
+        if len(_KB_STR_CACHE) >= _KB_STR_CACHE_MAX:
+            _KB_STR_CACHE.clear()
+        _KB_STR_CACHE[key] = (record_def, kb_str)
+        return kb_str
+
+    def _constraints_str(self, record_def: Mapping[str, Any]) -> str:
+        """Serialized filtered constraints for the record (depends on this processor's constraints)."""
+        cached = self._constraints_str_cache.get(id(record_def))
+        if cached is not None and cached[0] is record_def:
+            return cached[1]
+        constraints_str = _json_dumps(self._filter_constraints_for_record(record_def), indent=True)
+        self._constraints_str_cache[id(record_def)] = (record_def, constraints_str)
+        return constraints_str
+
+    def _trim_record_def(self, record_def: Mapping[str, Any], fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Copy record_def keeping its metadata but only the "fields" entries the
+        prompt asks for, to cut prompt tokens on wide records.
         
-        prompt = "\n".join(prompt_parts)
-        return prompt
-
-    def _normalize_field_name(self, name: str) -> str:
-        """Normalize Excel field name to match JSON key."""
-        # Example: "Header Identifier (Location Identifier)" -> "Header_Identifier_Location_Identifier"
-        if not name:
-            return ""
-        # 1. Replace " (" with "_" to separate
-        n = name.replace(" (", "_").replace("(", "_")
-        # 2. Remove ")"
-        n = n.replace(")", "")
-        # 3. Replace remaining spaces and dashes
-        n = n.replace(" ", "_").replace("-", "_")
-        # 4. Collapse multiple underscores
-        while "__" in n:
-            n = n.replace("__", "_")
-        return n
-
-    def _filter_constraints_for_record(self, record_def: Dict[str, Any]) -> Dict[str, Any]:
+        If any target has no exact/normalized key in the JSON, all fields are
+        kept so the LLM can still resolve it by semantic similarity.
+        """
+        all_fields = record_def.get("fields")
+        if not isinstance(all_fields, dict):
+            return dict(record_def)
+
+        wanted = {self._normalize_field_name(f["field_name"]) for f in fields}
+        kept = {
+            key: fdef for key, fdef in all_fields.items()
+            if key in wanted or self._normalize_field_name(key) in wanted
+        }
+        resolved = set(kept) | {self._normalize_field_name(key) for key in kept}
+        if not wanted <= resolved:
+            return dict(record_def)
+
+        trimmed = {k: v for k, v in record_def.items() if k != "fields"}
+        trimmed["fields"] = kept
+        return trimmed
+
+    def _filter_constraints_for_record(self, record_def: Mapping[str, Any]) -> Dict[str, Any]:
         """Filter global constraints to only those relevant for this record type to reduce prompt size."""
+        # record_defs come from the shared preload, so this runs once per record type
+        cached = self._filter_cache.get(id(record_def))
+        if cached is not None and cached[0] is record_def:
+            return cached[1]
+        filtered = self._filter_constraints_uncached(record_def)
+        self._filter_cache[id(record_def)] = (record_def, filtered)
+        return filtered
+
+    def _filter_constraints_uncached(self, record_def: Mapping[str, Any]) -> Dict[str, Any]:
         relevant_segments = set()
         
         # 1. Identify segments used in this record
@@ -262,7 +815,7 @@ class RecordProcessor:
         if not self.constraints:
             return {}
             
-        full_segments = self.constraints.get("segments", {})
+        full_segments = self._seg_rules
         
         # Also keep any general info? Just segments for now.
         filtered_segments = {}
@@ -277,19 +830,13 @@ class RecordProcessor:
             "note": "Filtered to reduce LLM context usage"
         }
 
-    def _load_record_json(self, record_num: str) -> Dict[str, Any]:
-        """Load JSON definition for the record."""
-        # Try exact match, then padded
-        candidates = [record_num, record_num.zfill(4)]
-        for c in candidates:
-            fpath = self.erp_json_dir / f"{c}.json"
-            if fpath.exists():
-                try:
-                    with open(fpath, 'r') as f:
-                        return json.load(f)
-                except Exception as e:
-                    self.logger.error(f"Error loading {fpath}: {e}")
-        return {}
+    def _load_record_json(self, record_num: str) -> Mapping[str, Any]:
+        """Load JSON definition for the record (cached, read-only)."""
+        return _load_record_json_cached(str(self.erp_json_dir), record_num)
+
+    def _field_index(self, record_num: str) -> Mapping[str, Any]:
+        """Raw + normalized field-name index into the record's "fields" (cached, read-only)."""
+        return _field_index_cached(str(self.erp_json_dir), record_num)
 
     def _map_x12_field(self, segment: str, element_idx_str: str, field_def: Dict[str, Any]) -> Dict[str, Any]:
         """Helper to map X12 fields checking sample data and constraints."""
@@ -303,30 +850,28 @@ class RecordProcessor:
         sample_val = ""
         found_in_sample = False
         
-        if segment in self.edi_parsed:
-            occurrences = self.edi_parsed[segment]
-            # Just take the first occurrence for "Sample Value" display
-            if occurrences:
-                elements = occurrences[0]
-                # EDI elements are 1-based in documentation, 0-based in list
-                # But lists in our parser are just values.
-                # If we parsed "BEG*00*NE", elements is ["00", "NE"].
-                # So "01" is index 0.
-                list_idx = elem_idx - 1
-                if 0 <= list_idx < len(elements):
-                    sample_val = elements[list_idx]
-                    found_in_sample = True
+        # Just take the first occurrence for "Sample Value" display
+        elements = self._first_occ.get(segment)
+        if elements:
+            # EDI elements are 1-based in documentation, 0-based in list
+            # But lists in our parser are just values.
+            # If we parsed "BEG*00*NE", elements is ["00", "NE"].
+            # So "01" is index 0.
+            list_idx = elem_idx - 1
+            if 0 <= list_idx < len(elements):
+                sample_val = elements[list_idx]
+                found_in_sample = True
         
         # 3. Check Constraints
         constraint_info = ""
-        seg_rules = self.constraints.get("segments", {}).get(segment, {})
+        seg_rules = self._seg_rules.get(segment, {})
         if seg_rules:
             req = seg_rules.get("req")
             if req in ["M", "Mandatory"]:
                 constraint_info += " [Mandatory]"
             
             # Check allowed values
-            elem_rules = seg_rules.get("elements", {}).get(element_idx_str, {})
+            elem_rules = self._elem_rules.get((segment, element_idx_str), {})
             allowed = elem_rules.get("values")
             if allowed:
                 constraint_info += f" [Allowed: {', '.join(allowed)}]"
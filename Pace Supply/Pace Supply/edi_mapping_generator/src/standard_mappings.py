@@ -5,13 +5,23 @@ Contains static/constant mappings for standard ERP fields that appear in every r
 Loads mappings from input/standard_field_mappings.json if available.
 """
 import json
+import re
+import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 
 # Standard field names (the green fields in the ERP definition)
-# We use a set of stripped names for fast lookup
-_STANDARD_FIELD_SET = {
+# We use a frozen set of stripped, interned names for fast lookup
+_STANDARD_FIELD_SET = frozenset(map(sys.intern, {
     "TP Translator Code",
     "TP_Translator_Code",
     "Header Identifier (Location Identifier)",
@@ -20,98 +30,160 @@ _STANDARD_FIELD_SET = {
     "Record Number",
     "Record Type Identifier",
     "Record Layout Qualifier"
-}
+}))
+
+# Segment references look like "BEG03" / "N104": two letters, then a digit somewhere after
+_SEGMENT_REF_MATCH = re.compile(r"[A-Za-z]{2}.*\d", re.DOTALL).match
 
 # Map variations to the names used in the JSON
 _FIELD_NAME_MAP = {
-    "TP_Translator_Code": "TP Translator Code"
+    sys.intern("TP_Translator_Code"): sys.intern("TP Translator Code")
 }
 
+# Every standard name (and variation) -> its JSON key, so membership and
+# translation are a single probe
+_CANONICAL = {name: _FIELD_NAME_MAP.get(name, name) for name in _STANDARD_FIELD_SET}
+
 # Load mappings from JSON file
 _MAPPINGS_FILE = Path(__file__).parent.parent / "input" / "standard_field_mappings.json"
-_LOADED_MAPPINGS: Dict[str, Dict[str, str]] = {}
-_NORMALIZED_KEYS: Dict[str, str] = {}  # Map normalized keys to original keys
+_LOADED_MAPPINGS: Dict[str, Mapping[str, Dict[str, Any]]] = {}
+_MAPPINGS_MTIME: Optional[int] = None  # mtime_ns of the file behind _LOADED_MAPPINGS
+_INT_KEYS: Dict[int, str] = {}  # Numeric value of each key -> original key ("10" and "0010" both hit 10)
+
+
+# Result dicts by raw value; the same "GS02"/"" shows up in nearly every record
+_RESULT_CACHE: Dict[Optional[str], Dict[str, Any]] = {}
+
+
+def _classify(value: Optional[str]) -> Dict[str, Any]:
+    """Turn a raw JSON value into its (shared) mapping dict."""
+    result = _RESULT_CACHE.get(value)
+    if result is None:
+        result = _RESULT_CACHE[value] = _classify_uncached(value)
+    return result
+
+
+def _classify_uncached(value: Optional[str]) -> Dict[str, Any]:
+    """Build the mapping dict for a raw JSON value (segment reference or constant)."""
+    if value and _SEGMENT_REF_MATCH(value):
+        return {
+            "segment": value,
+            "constant": None,
+            "logic": f"Standard field - mapped to {value}"
+        }
+    elif value is not None:
+        return {
+            "segment": None,
+            "constant": value,
+            "logic": f"Standard field - constant value '{value}'"
+        }
+    else:
+        return {
+            "segment": None,
+            "constant": "",
+            "logic": "Standard field - empty value"
+        }
+
+
+def _classify_fields(record: str, fields: Any) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Classify one record's field values, skipping entries that are not strings or null."""
+    if not isinstance(fields, dict):
+        print(f"Warning: Skipping standard mappings for record {record}: expected an object")
+        return None
+    record_mappings = {}
+    for name, value in fields.items():
+        if value is not None and not isinstance(value, str):
+            print(f"Warning: Skipping standard mapping {record}.{name}: unsupported value {value!r}")
+            continue
+        record_mappings[name] = _classify(value)
+    return record_mappings
+
 
 def _load_mappings():
     """Load standard field mappings from JSON file."""
-    global _LOADED_MAPPINGS, _NORMALIZED_KEYS
+    global _LOADED_MAPPINGS, _INT_KEYS, _MAPPINGS_MTIME
     if _MAPPINGS_FILE.exists():
         try:
-            with open(_MAPPINGS_FILE, 'r') as f:
-                _LOADED_MAPPINGS = json.load(f)
-            # Create normalized key mapping (strip leading zeros)
-            for key in _LOADED_MAPPINGS.keys():
-                normalized = key.lstrip('0') or key
-                _NORMALIZED_KEYS[normalized] = key
-                _NORMALIZED_KEYS[key] = key  # Also map original to itself
+            mtime = _MAPPINGS_FILE.stat().st_mtime_ns
+            if mtime == _MAPPINGS_MTIME:
+                return  # Unchanged since the last load; keep the parsed copy and caches
+            raw = _json_loads(_MAPPINGS_FILE.read_bytes())
+            # Classify every value once here instead of on each lookup; the per-record
+            # dicts are shared by every key variant and cached lookup, so freeze them
+            _LOADED_MAPPINGS = {}
+            for record, fields in raw.items():
+                record_mappings = _classify_fields(record, fields)
+                if record_mappings is not None:
+                    _LOADED_MAPPINGS[record] = MappingProxyType(record_mappings)
+            # Record keys are zero-padded numbers; index them by value so any padding matches
+            _INT_KEYS = {}
+            for key in _LOADED_MAPPINGS:
+                if key.isascii() and key.isdecimal():
+                    _INT_KEYS.setdefault(int(key), key)
+            # Also store the usual spellings ("10", "0010") as direct keys sharing the
+            # same inner dict, so most lookups are one probe
+            for key, record_mappings in list(_LOADED_MAPPINGS.items()):
+                for variant in (key.lstrip('0') or key, key.zfill(4)):
+                    _LOADED_MAPPINGS.setdefault(variant, record_mappings)
+            _MAPPINGS_MTIME = mtime
         except Exception as e:
             print(f"Warning: Could not load standard mappings: {e}")
             _LOADED_MAPPINGS = {}
-
-# Load on module import
-_load_mappings()
+            _MAPPINGS_MTIME = None
+    # Lookups below are memoized against the previous contents
+    _find_record_mapping.cache_clear()
+    _get_standard_mapping_cached.cache_clear()
 
 
-def _find_record_mapping(record_type: str) -> Optional[Dict[str, str]]:
+# Misses are cached too (lru_cache memoizes the None), so unknown record types
+# from a new feed cost one int() attempt on first sight and nothing afterwards
+@lru_cache(maxsize=1024)
+def _find_record_mapping(record_type: str) -> Optional[Mapping[str, Dict[str, Any]]]:
     """Find mapping for a record type, handling different key formats."""
-    # Try direct match
-    if record_type in _LOADED_MAPPINGS:
-        return _LOADED_MAPPINGS[record_type]
-    
-    # Try normalized (without leading zeros)
-    normalized = record_type.lstrip('0') or record_type
-    if normalized in _NORMALIZED_KEYS:
-        original_key = _NORMALIZED_KEYS[normalized]
-        return _LOADED_MAPPINGS.get(original_key)
-    
-    # Try with leading zeros (e.g., "10" -> "0010")
-    padded = record_type.zfill(4)
-    if padded in _LOADED_MAPPINGS:
-        return _LOADED_MAPPINGS[padded]
+    # Direct match, including the unpadded/zero-padded variants added at load
+    record_mappings = _LOADED_MAPPINGS.get(record_type)
+    if record_mappings is not None:
+        return record_mappings
     
-    return None
+    # Any other padding of the same number (e.g., "010" -> "0010"). Plain ASCII
+    # digits only: int() would also accept " 10", "+10", "1_0" and non-ASCII digits
+    if not (record_type.isascii() and record_type.isdecimal()):
+        return None
+    original_key = _INT_KEYS.get(int(record_type))
+    return _LOADED_MAPPINGS.get(original_key) if original_key is not None else None
 
 
 def get_standard_mapping(field_name: str, record_type: str) -> Optional[Dict[str, Any]]:
     """
     Get the standard mapping for a field based on record type.
-    """
-    field_name = field_name.strip()
     
-    if field_name not in _STANDARD_FIELD_SET:
+    Returns a fresh dict each call, so callers may edit it freely.
+    """
+    standard = _get_standard_mapping_cached(field_name.strip(), record_type)
+    return dict(standard) if standard is not None else None
+
+
+@lru_cache(maxsize=1024)
+def _get_standard_mapping_cached(field_name: str, record_type: str) -> Optional[Dict[str, Any]]:
+    """Lookup behind get_standard_mapping, keyed on the stripped field name.
+
+    The returned dict is the shared _RESULT_CACHE entry; public callers get a copy.
+    """
+    # Standard name resolved to its JSON key (None if not a standard field)
+    json_field_name = _CANONICAL.get(field_name)
+    if json_field_name is None:
         return None
     
-    # Use mapped name for JSON lookup if needed
-    json_field_name = _FIELD_NAME_MAP.get(field_name, field_name)
-    
     record_mappings = _find_record_mapping(record_type)
     if not record_mappings:
         return None
     
-    if json_field_name not in record_mappings:
-        return None
-    
-    value = record_mappings[json_field_name]
-    
-    # Determine if it's a segment reference or a constant
-    if value and len(value) >= 3 and value[:2].isalpha() and any(c.isdigit() for c in value[2:]):
-        return {
-            "segment": value,
-            "constant": None,
-            "logic": f"Standard field - mapped to {value}"
-        }
-    elif value is not None:
-        return {
-            "segment": None,
-            "constant": value,
-            "logic": f"Standard field - constant value '{value}'"
-        }
-    else:
-        return {
-            "segment": None,
-            "constant": "",
-            "logic": "Standard field - empty value"
-        }
+    # Values are always result dicts, so None from a single get means "not mapped"
+    return record_mappings.get(json_field_name)
+
+
+# Load on module import (after the cached lookups exist, so they can be cleared)
+_load_mappings()
 
 
 def is_standard_field(field_name: str) -> bool:
@@ -128,8 +200,24 @@ def apply_standard_mappings(
     Apply standard mappings to fields.
     For known standard fields, ALWAYS use the standard mapping (override AI).
     """
-    for field_name in field_names:
-        standard = get_standard_mapping(field_name, record_type)
-        if standard:
-            mappings[field_name] = standard
+    record_mappings = _find_record_mapping(record_type)
+    if not record_mappings:
+        return mappings
+    
+    # Resolve each distinct standard name once, then write every hit back in a
+    # single update (keys stay as the caller spelled them, unstripped). Each field
+    # gets its own copy: the cached dicts are shared across records, and session
+    # edits (MappingService.update_mapping) update these dicts in place.
+    stripped = {field_name: field_name.strip() for field_name in field_names}
+    resolved = {}
+    for name in _STANDARD_FIELD_SET.intersection(stripped.values()):
+        standard = record_mappings.get(_CANONICAL[name])
+        if standard is not None:
+            resolved[name] = standard
+    
+    mappings.update({
+        field_name: dict(resolved[name])
+        for field_name, name in stripped.items()
+        if name in resolved
+    })
     return mappings
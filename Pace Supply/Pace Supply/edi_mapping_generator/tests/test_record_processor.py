@@ -0,0 +1,104 @@
+"""
+Tests for RecordProcessor constraint handling.
+"""
+import sys
+from pathlib import Path
+
+# src/ modules use flat imports (from logger import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from record_processor import RecordProcessor
+
+
+# Shape returned by PdfConstraintExtractor.extract_constraints
+EXTRACTED_CONSTRAINTS = [
+    {
+        "segment": "BEG",
+        "description": "Beginning Segment for Purchase Order",
+        "status": "M",
+        "fields": [
+            {"id": "BEG01", "description": "Transaction Set Purpose Code", "status": "M", "values": ["00"]},
+            {"id": "BEG02", "description": "Purchase Order Type Code", "status": "M", "values": ["SA", "DS"]},
+        ],
+    },
+    {
+        "segment": "REF",
+        "description": "Reference Identification",
+        "status": "O",
+        "fields": [{"id": "REF01", "description": "Reference Qualifier", "status": "M", "values": []}],
+    },
+]
+
+
+def test_constructs_from_extracted_constraint_list():
+    processor = RecordProcessor(None, {"BEG": [["00", "SA"]]}, EXTRACTED_CONSTRAINTS)
+
+    assert set(processor.constraints["segments"]) == {"BEG", "REF"}
+    assert processor.constraints["segments"]["BEG"] is EXTRACTED_CONSTRAINTS[0]
+
+    record_def = {"fields": {"PO Type": {"x12_mapping": {"segment": "BEG", "element": "02"}}}}
+    filtered = processor._filter_constraints_for_record(record_def)
+    assert filtered["segments"] == {"BEG": EXTRACTED_CONSTRAINTS[0]}
+
+
+def test_constructs_without_constraints():
+    for constraints in (None, [], {}):
+        processor = RecordProcessor(None, {}, constraints)
+        assert processor._filter_constraints_for_record({"fields": {}}) == {}
+
+
+def test_map_x12_field_matches_nested_constraint_lookup():
+    constraints = {
+        "segments": {
+            "BEG": {
+                "req": "M",
+                "elements": {"01": {"values": ["00"]}, "02": {"values": ["SA", "DS"]}, "03": {}},
+            },
+            "REF": {"req": "O", "elements": {"01": {"values": ["PO", "VN"]}}},
+            "N1": {"req": "M"},
+        }
+    }
+    edi_parsed = {"BEG": [["00", "NE", "4500012345"]], "REF": [["ZZ"]]}
+    processor = RecordProcessor(None, edi_parsed, constraints)
+
+    for segment in ("BEG", "REF", "N1", "PO1"):
+        for element in ("01", "02", "03", "04"):
+            # Lookup as it was done before the rules were flattened
+            seg_rules = constraints["segments"].get(segment, {})
+            expected = seg_rules.get("elements", {}).get(element, {}) if seg_rules else {}
+            assert processor._elem_rules.get((segment, element), {}) == expected
+
+            logic = processor._map_x12_field(segment, element, {})["logic"]
+            if expected.get("values"):
+                assert f"[Allowed: {', '.join(expected['values'])}]" in logic
+            else:
+                assert "Allowed" not in logic
+
+    # Sample value outside the allowed list is flagged
+    assert "[WARNING: Sample 'NE' not in allowed list]" in processor._map_x12_field("BEG", "02", {})["logic"]
+
+    # Extracted segment entries carry no per-element rules
+    processor = RecordProcessor(None, edi_parsed, EXTRACTED_CONSTRAINTS)
+    assert processor._elem_rules == {}
+    assert processor._map_x12_field("BEG", "02", {})["logic"] == "Sample: 'NE'"
+
+
+def test_record_defs_reload_when_erp_json_changes(tmp_path):
+    from record_processor import _field_index_cached, _load_all_record_defs, _load_record_json_cached
+
+    erp_dir = str(tmp_path)
+    (tmp_path / "0010.json").write_text('{"fields": {"PO Number": {"id": 1}}}')
+    assert _field_index_cached(erp_dir, "10")["PO Number"] == {"id": 1}
+
+    # Snapshot lookups do not re-read the directory
+    (tmp_path / "0020.json").write_text('{"fields": {"Ship To": {}}}')
+    assert _load_record_json_cached(erp_dir, "20") == {}
+
+    # A refresh picks up added and edited files and drops stale field indexes
+    (tmp_path / "0010.json").write_text('{"fields": {"PO Number": {"id": 2}, "PO Date": {}}}')
+    defs = _load_all_record_defs(erp_dir, refresh=True)
+    assert set(defs) >= {"0010", "0020"}
+    assert _field_index_cached(erp_dir, "10")["PO Number"] == {"id": 2}
+
+    # Unchanged directory keeps the same snapshot
+    assert _load_all_record_defs(erp_dir, refresh=True) is defs
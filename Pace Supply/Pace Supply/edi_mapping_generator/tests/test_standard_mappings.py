@@ -0,0 +1,39 @@
+"""
+Tests for loading standard field mappings.
+"""
+import json
+import sys
+from pathlib import Path
+
+# src/ modules use flat imports (from logger import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import standard_mappings
+
+
+def test_bad_value_skips_only_that_entry(tmp_path, monkeypatch, capsys):
+    mappings_file = tmp_path / "standard_field_mappings.json"
+    mappings_file.write_text(json.dumps({
+        "0010": {"TP Translator Code": "GS02", "Record Number": 10, "Record Type Identifier": None},
+        "0020": {"Header Identifier (Location Identifier)": "BEG03"},
+        "0030": ["not", "an", "object"],
+    }))
+    monkeypatch.setattr(standard_mappings, "_MAPPINGS_FILE", mappings_file)
+    monkeypatch.setattr(standard_mappings, "_MAPPINGS_MTIME", None)
+    try:
+        standard_mappings._load_mappings()
+
+        warnings = capsys.readouterr().out
+        assert "0010.Record Number" in warnings
+        assert "record 0030" in warnings
+
+        get = standard_mappings.get_standard_mapping
+        assert get("TP Translator Code", "10")["segment"] == "GS02"
+        assert get("Header Identifier (Location Identifier)", "0020")["segment"] == "BEG03"
+        assert get("Record Type Identifier", "0010")["segment"] is None
+        assert get("Record Number", "0010") is None
+        assert get("TP Translator Code", "0030") is None
+    finally:
+        monkeypatch.undo()
+        standard_mappings._MAPPINGS_MTIME = None
+        standard_mappings._load_mappings()
@@ -1,24 +1,25 @@
 import sys
 from pathlib import Path
-from openpyxl import load_workbook
 
 def verify_record_0020(filepath):
+    from openpyxl import load_workbook  # deferred: only needed once a file is checked
+
     print(f"Verifying Record 0020 in: {filepath}")
-    wb = load_workbook(filepath, data_only=True)
+    # read_only streams the sheet XML; we never write, touch formatting or follow external links
+    wb = load_workbook(filepath, data_only=True, read_only=True, keep_links=False)
     ws = wb[' Inbound X12 to Oracle']
     
     count_0020 = 0
     failures_0020 = 0
     
     print("-" * 60)
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if not row: continue
-        
-        record_ref = str(row[5]) if row[5] else "" # Column F
+    # Only columns A..J are used (A = field, F = record ref, J = logic); read-only
+    # mode pads short rows to max_col, so the unpack is always ten wide
+    for field_name, _, _, _, _, record_ref, _, _, _, logic in ws.iter_rows(
+            min_row=2, max_col=10, values_only=True):
+        record_ref = str(record_ref) if record_ref else "" # Column F
         if "0020" in record_ref:
             count_0020 += 1
-            field_name = row[0]
-            logic = row[9] # Column J
             
             status = "OK"
             if logic and "Cannot determine mapping" in str(logic):
@@ -27,6 +28,8 @@ def verify_record_0020(filepath):
                 
             print(f"0020 | {field_name:<40} | {status} | {'Logic: ' + str(logic)[:50] if logic else ''}")
 
+    wb.close()
+
     print("-" * 60)
     print(f"Total 0020 Fields: {count_0020}")
     print(f"Failures: {failures_0020}")
@@ -1,10 +1,19 @@
+import re
 import sys
 from pathlib import Path
-from openpyxl import load_workbook
+
+# "Cannot determine mapping" together with the generic "not in KB" reason, in either order
+_FAIL_RE = re.compile(
+    r"(?=.*Cannot determine mapping)(?=.*(?:no Knowledge Base definition found|not in KB))",
+    re.DOTALL
+).match
 
 def verify_output(filepath):
+    from openpyxl import load_workbook  # deferred: only needed once a file is checked
+
     print(f"Verifying: {filepath}")
-    wb = load_workbook(filepath, data_only=True)
+    # read_only streams the sheet XML; we never write, touch formatting or follow external links
+    wb = load_workbook(filepath, data_only=True, read_only=True, keep_links=False)
     ws = wb[' Inbound X12 to Oracle']
     
     errors_found = 0
@@ -13,26 +22,21 @@ def verify_output(filepath):
     print(f"\nScanning for 'Cannot determine mapping' errors...")
     print("-" * 60)
 
-    # Column J is index 9 (0-based) or 'J'
-    # Iterate rows
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if not row: continue
-        
-        field_name = row[0]
-        record_ref = row[5] # Column F
-        logic = row[9]      # Column J
-        
+    # Column F is the record ref, column J (index 9) the logic. Nothing past J
+    # is needed, and read-only mode pads short rows to max_col.
+    for field_name, _, _, _, _, record_ref, _, _, _, logic in ws.iter_rows(
+            min_row=2, max_col=10, values_only=True):
         if not field_name or not record_ref:
             continue
             
         record_ref = str(record_ref).split('.')[0].zfill(4)
         checked_records.add(record_ref)
 
-        if logic and "Cannot determine mapping" in str(logic):
-            # Only flag if it's the "not in KB" generic error, specific reasons might be valid
-            if "no Knowledge Base definition found" in str(logic) or "not in KB" in str(logic):
-                print(f"[FAIL] Record {record_ref} | Field: {field_name} | Logic: {logic}")
-                errors_found += 1
+        # Only flag if it's the "not in KB" generic error, specific reasons might be valid
+        if logic and _FAIL_RE(logic if isinstance(logic, str) else str(logic)):
+            print(f"[FAIL] Record {record_ref} | Field: {field_name} | Logic: {logic}")
+            errors_found += 1
+    wb.close()
     
     print("-" * 60)
     print(f"Checked {len(checked_records)} record types.")
@@ -1,17 +1,23 @@
 
-import pandas as pd
+import os
+from itertools import islice
 from pathlib import Path
 import glob
+from openpyxl import load_workbook
 
-# Find the latest output file
-files = list(Path("output").glob("generated_mapping_*.xlsx"))
-files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-latest_file = files[0]
+# Find the latest output file (scandir entries carry cached stat info, and max avoids a full sort)
+with os.scandir("output") as entries:
+    latest_file = Path(max(
+        (e for e in entries if e.name.startswith("generated_mapping_") and e.name.endswith(".xlsx")),
+        key=lambda e: e.stat().st_mtime
+    ).path)
 
 print(f"Checking file: {latest_file}")
 
-# Load the file
-df = pd.read_excel(latest_file, sheet_name=" Inbound X12 to Oracle")
+# Stream the sheet instead of building a DataFrame (we stop after a few rows anyway);
+# external link parts are never needed so skip loading them
+wb = load_workbook(latest_file, data_only=True, read_only=True, keep_links=False)
+ws = wb[" Inbound X12 to Oracle"]
 
 # Columns (assuming standard mapping template)
 # B -> Segment/Element (index 1)
@@ -20,22 +26,19 @@ df = pd.read_excel(latest_file, sheet_name=" Inbound X12 to Oracle")
 
 # Print first 20 mapped rows
 print("\n--- Mapped Rows Sample ---")
+# Rows where B, C or J has content, filtered lazily; islice stops the sheet stream after 10
+mapped_rows = (
+    row for row in ws.iter_rows(min_row=2, max_col=10, values_only=True)
+    if row[1] not in (None, "") or row[2] not in (None, "") or row[9] not in (None, "")
+)
 count = 0
-for idx, row in df.iterrows():
-    # Check if B or C or J has content
-    b_val = row.iloc[1] if len(row) > 1 else None
-    c_val = row.iloc[2] if len(row) > 2 else None
-    j_val = row.iloc[9] if len(row) > 9 else None
-    
-    if pd.notna(b_val) or pd.notna(c_val) or pd.notna(j_val):
-        field_name = row.iloc[0]
-        print(f"Field: {field_name}")
-        print(f"  Col B (Segment): {b_val}")
-        print(f"  Col C (Constant): {c_val}")
-        print(f"  Col J (Logic): {j_val}")
-        print("-" * 30)
-        count += 1
-        if count >= 10:
-            break
+for field_name, b_val, c_val, _, _, _, _, _, _, j_val in islice(mapped_rows, 10):
+    print(f"Field: {field_name}")
+    print(f"  Col B (Segment): {b_val}")
+    print(f"  Col C (Constant): {c_val}")
+    print(f"  Col J (Logic): {j_val}")
+    print("-" * 30)
+    count += 1
+wb.close()
 
 print(f"\nTotal rows checked: {count}")